@@ -5,6 +5,7 @@ from traceback import format_exc
 from pyrogram import idle
 from Backend import __version__, db
 from Backend.helper.pinger import ping
+from Backend.helper.media_sessions import media_session_health_check, prewarm_media_sessions
 from Backend.logger import LOGGER
 from Backend.fastapi import server
 from Backend.helper.pyro import restart_notification, setup_bot_commands
@@ -35,6 +36,9 @@ async def start_services():
         await initialize_clients()
         await asleep(2)
 
+        LOGGER.info("Pre-warming Media Sessions...")
+        await prewarm_media_sessions()
+
         await setup_bot_commands(StreamBot)
         await asleep(2)
 
@@ -42,6 +46,7 @@ async def start_services():
         await restart_notification()
         loop.create_task(server.serve())
         loop.create_task(ping())
+        loop.create_task(media_session_health_check())
         
         LOGGER.info("Telegram-Stremio Started Successfully!")
         await idle()
@@ -24,4 +24,27 @@ class Telegram:
 
     ADMIN_USERNAME = getenv("ADMIN_USERNAME", "fyvio")
     ADMIN_PASSWORD = getenv("ADMIN_PASSWORD", "fyvio")
+
+    STREAM_PREFETCH_PARTS = int(getenv("STREAM_PREFETCH_PARTS", "4"))
+    STREAM_MAX_INFLIGHT = int(getenv("STREAM_MAX_INFLIGHT", "64"))
+    STREAM_STRIPE_CLIENTS = int(getenv("STREAM_STRIPE_CLIENTS", "1"))
+    STREAM_RETRIES = int(getenv("STREAM_RETRIES", "5"))
+    STREAM_FLOOD_WAIT_MAX = int(getenv("STREAM_FLOOD_WAIT_MAX", "15"))
+    STREAM_SCHEDULER = getenv("STREAM_SCHEDULER", "weighted")
+    STREAM_CONNECTION_RATE_MBPS = float(getenv("STREAM_CONNECTION_RATE_MBPS", "0"))
+    STREAM_BULK_RATE_MBPS = float(getenv("STREAM_BULK_RATE_MBPS", "0"))
+    STREAM_IP_RATE_MBPS = float(getenv("STREAM_IP_RATE_MBPS", "0"))
+    STREAM_GLOBAL_RATE_MBPS = float(getenv("STREAM_GLOBAL_RATE_MBPS", "0"))
+
+    FILE_ID_CACHE_TTL = int(getenv("FILE_ID_CACHE_TTL", "1800"))
+    FILE_ID_CACHE_SIZE = int(getenv("FILE_ID_CACHE_SIZE", "2048"))
+
+    MEDIA_SESSION_PREWARM = getenv("MEDIA_SESSION_PREWARM", "True").lower() == "true"
+    MEDIA_SESSION_HEALTH_INTERVAL = int(getenv("MEDIA_SESSION_HEALTH_INTERVAL", "300"))
+    MEDIA_SESSIONS_PER_DC = int(getenv("MEDIA_SESSIONS_PER_DC", "3"))
+
+    CHUNK_CACHE_DIR = getenv("CHUNK_CACHE_DIR", "")
+    CHUNK_CACHE_SIZE_MB = int(getenv("CHUNK_CACHE_SIZE_MB", "2048"))
+
+    METRICS_TOKEN = getenv("METRICS_TOKEN", "")
     
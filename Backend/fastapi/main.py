@@ -1,9 +1,11 @@
 from fastapi import FastAPI, Request, Form, Depends, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from Backend import __version__
+from Backend.config import Telegram
 
 from Backend.fastapi.security.credentials import require_auth
 from Backend.fastapi.routes.stream_routes import router as stream_router
@@ -132,6 +134,19 @@ async def get_workloads(_: bool = Depends(require_auth)):
         return {"loads": {}}
 
 
+@app.get("/api/system/indexes")
+async def get_indexes(_: bool = Depends(require_auth)):
+    from Backend import db
+    return await db.get_index_report()
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    if Telegram.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {Telegram.METRICS_TOKEN}":
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.exception_handler(401)
 async def auth_exception_handler(request: Request, exc):
     return RedirectResponse(url="/login", status_code=302)
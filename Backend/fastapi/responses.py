@@ -0,0 +1,56 @@
+import asyncio
+from typing import AsyncGenerator, Mapping, Optional, Union
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from Backend.logger import LOGGER
+
+
+class MediaStreamResponse(Response):
+    # StreamingResponse for /dl. A watcher task listens for http.disconnect while the
+    # body is written, and a disconnect cancels the writer at once: the Telegram stream
+    # unwinds mid-GetFile, its prefetch tasks are cancelled and the client's work_loads
+    # slot is freed without waiting for the next part. Chunks are pulled only after the
+    # previous send returned, and the server's send waits for the socket to drain, so
+    # read-ahead stays within STREAM_PREFETCH_PARTS of what the client has accepted.
+    def __init__(
+        self,
+        content: AsyncGenerator[Union[bytes, memoryview], None],
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.body_iterator = content
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def stream_response(self, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def wait_for_disconnect(self, receive: Receive) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        writer = asyncio.create_task(self.stream_response(send))
+        watcher = asyncio.create_task(self.wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({writer, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (writer, watcher):
+                task.cancel()
+            await asyncio.gather(writer, watcher, return_exceptions=True)
+            await self.body_iterator.aclose()
+
+        if watcher.done() and not watcher.cancelled():
+            LOGGER.debug(f"Client disconnected from {scope.get('path')}, stream cancelled")
+            return
+        if not writer.cancelled() and isinstance(writer.exception(), OSError):
+            # ASGI 2.4 servers raise on send once the client is gone.
+            return
+        if not writer.cancelled() and writer.exception() is not None:
+            raise writer.exception()
@@ -11,18 +11,14 @@ async def list_media_api(
 ):
     try:
         if search:
-            result = await db.search_documents(search, page, page_size)
-            filtered_results = [item for item in result['results'] if item.get('media_type') == media_type]
-            total_filtered = len(filtered_results)
-            start_index = (page - 1) * page_size
-            end_index = start_index + page_size
-            paged_results = filtered_results[start_index:end_index]
-            
+            result = await db.search_documents(search, page, page_size, media_type=media_type)
+            total_count = result['total_count']
+
             return {
-                "total_count": total_filtered,
+                "total_count": total_count,
                 "current_page": page,
-                "total_pages": (total_filtered + page_size - 1) // page_size,
-                "movies" if media_type == "movie" else "tv_shows": paged_results
+                "total_pages": (total_count + page_size - 1) // page_size,
+                "movies" if media_type == "movie" else "tv_shows": result['results']
             }
         else:
             if media_type == "movie":
@@ -1,38 +1,179 @@
-import math
+import asyncio
 import secrets
 import mimetypes
-from typing import Tuple
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.fastapi.responses import MediaStreamResponse
 from Backend.helper.encrypt import decode_string
 from Backend.helper.exceptions import InvalidHash
-from Backend.helper.custom_dl import ByteStreamer
-from Backend.pyrofork.bot import StreamBot, work_loads, multi_clients
+from Backend.helper.custom_dl import ByteStreamer, class_cache, get_streamer, yield_file_striped
+from Backend.helper.file_resolver import file_resolver
+from Backend.helper.scheduler import scheduler
+from Backend.helper.shaper import BULK, INTERACTIVE, shaper
+from Backend.pyrofork.bot import multi_clients
 
 router = APIRouter(tags=["Streaming"])
-class_cache = {}
 
+MIN_CHUNK_SIZE = 4 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+MAX_RANGES = 16
 
-def parse_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    # RFC 7233 byte-range sets: "a-b", open "a-" and suffix "-n" specs, comma separated.
+    # Unsatisfiable members are dropped, overlapping ones merged; 416 only if none remain.
+    # A header that does not parse is ignored (section 3.1): None means serve the whole file.
     if not range_header:
-        return 0, file_size - 1
+        return [(0, file_size - 1)]
     try:
-        range_value = range_header.replace("bytes=", "")
-        from_str, until_str = range_value.split("-")
-        from_bytes = int(from_str)
-        until_bytes = int(until_str) if until_str else file_size - 1
+        unit, _, range_set = range_header.partition("=")
+        if unit.strip().lower() != "bytes":
+            raise ValueError(f"unsupported unit {unit!r}")
+        specs = [spec.strip() for spec in range_set.split(",") if spec.strip()]
+        if not specs:
+            raise ValueError("empty range set")
+        if len(specs) > MAX_RANGES:
+            raise ValueError("too many ranges")
+
+        ranges = []
+        for spec in specs:
+            from_str, until_str = spec.split("-")
+            if not from_str:
+                suffix_length = int(until_str)
+                if suffix_length <= 0:
+                    continue
+                from_bytes, until_bytes = max(0, file_size - suffix_length), file_size - 1
+            else:
+                from_bytes = int(from_str)
+                until_bytes = min(int(until_str), file_size - 1) if until_str else file_size - 1
+                if from_bytes < 0 or (until_str and int(until_str) < from_bytes):
+                    raise ValueError(f"invalid range {spec!r}")
+            if from_bytes < file_size:
+                ranges.append((from_bytes, until_bytes))
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Range header: {e}")
+        LOGGER.debug(f"Ignoring invalid Range header {range_header!r}: {e}")
+        return None
 
-    if (until_bytes > file_size - 1) or (from_bytes < 0) or (until_bytes < from_bytes):
+    if not ranges:
         raise HTTPException(
             status_code=416,
             detail="Requested Range Not Satisfiable",
             headers={"Content-Range": f"bytes */{file_size}"},
         )
 
-    return from_bytes, until_bytes
+    merged = []
+    for from_bytes, until_bytes in sorted(ranges):
+        if merged and from_bytes <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], until_bytes))
+        else:
+            merged.append((from_bytes, until_bytes))
+    return merged
+
+
+def get_chunk_size(from_bytes: int, until_bytes: int) -> int:
+    # Smallest power-of-two part (4 KiB..1 MiB) whose aligned block holds the whole range.
+    # Container probes then cost one small GetFile; long and sequential reads use 1 MiB.
+    # Every size divides 1 MiB, so parts never cross the 1 MiB boundary GetFile requires.
+    chunk_size = MIN_CHUNK_SIZE
+    while chunk_size < MAX_CHUNK_SIZE and from_bytes // chunk_size != until_bytes // chunk_size:
+        chunk_size *= 2
+    return chunk_size
+
+
+def parse_http_date(value: str) -> Optional[int]:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    # If-None-Match compares weakly ("W/" ignored), If-Match and If-Range strongly.
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def check_preconditions(request: Request, etag: str, last_modified: int) -> Optional[int]:
+    # RFC 7232 section 6 order; returns 412/304 when the request can be answered without a body.
+    if_match = request.headers.get("If-Match")
+    if if_match is not None and not etag_matches(if_match, etag, weak=False):
+        return 412
+    if_unmodified_since = request.headers.get("If-Unmodified-Since")
+    if if_match is None and if_unmodified_since and last_modified:
+        since = parse_http_date(if_unmodified_since)
+        if since is not None and last_modified > since:
+            return 412
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return 304 if etag_matches(if_none_match, etag) else None
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since and last_modified:
+        since = parse_http_date(if_modified_since)
+        if since is not None and last_modified <= since:
+            return 304
+    return None
+
+
+def range_applies(request: Request, etag: str, last_modified: int) -> bool:
+    # If-Range: honour Range only while the validator still matches, else send the full file.
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return etag_matches(if_range, etag, weak=False)
+    return bool(last_modified) and parse_http_date(if_range) == last_modified
+
+
+def get_warm_clients(chat_id: int, message_id: int):
+    # Clients whose ByteStreamer already holds a FileId for this message.
+    return [
+        index for index, client in multi_clients.items()
+        if client in class_cache and class_cache[client].cached_file_ids.peek((chat_id, message_id))
+    ]
+
+
+async def get_stripes(index: int, tg_connect: ByteStreamer, file_id, chat_id: int, message_id: int):
+    # Opt-in: spread one response over the STREAM_STRIPE_CLIENTS least loaded bots.
+    # Each bot resolves its own FileId, since file references are per client.
+    if Telegram.STREAM_STRIPE_CLIENTS <= 1 or len(multi_clients) <= 1:
+        return []
+
+    others = scheduler.pick_many(
+        Telegram.STREAM_STRIPE_CLIENTS - 1, dc_id=file_id.dc_id, exclude=[index],
+        warm=get_warm_clients(chat_id, message_id)
+    )
+    stripes = [(index, tg_connect, file_id)]
+
+    async def resolve(i: int):
+        streamer = get_streamer(i)
+        try:
+            return i, streamer, await streamer.get_file_properties(chat_id=chat_id, message_id=message_id)
+        except Exception as e:
+            LOGGER.debug(f"Client {i} skipped for striping: {e}")
+            return None
+
+    resolved = await asyncio.gather(*(resolve(i) for i in others))
+    stripes.extend(
+        stripe for stripe in resolved
+        if stripe and stripe[2].unique_id == file_id.unique_id
+    )
+    return stripes
 
 
 @router.get("/dl/{id}/{name}")
@@ -43,15 +184,10 @@ async def stream_handler(request: Request, id: str, name: str):
         raise HTTPException(status_code=400, detail="Missing id")
 
     chat_id = f"-100{decoded_data['chat_id']}"
-    message = await StreamBot.get_messages(int(chat_id), int(decoded_data["msg_id"]))
-    file = message.video or message.document
-    file_hash = file.file_unique_id[:6]
-
     return await media_streamer(
         request,
         chat_id=int(chat_id),
-        id=int(decoded_data["msg_id"]),
-        secure_hash=file_hash
+        id=int(decoded_data["msg_id"])
     )
 
 
@@ -59,34 +195,64 @@ async def media_streamer(
     request: Request,
     chat_id: int,
     id: int,
-    secure_hash: str,
-) -> StreamingResponse:
+    secure_hash: Optional[str] = None,
+) -> MediaStreamResponse:
     range_header = request.headers.get("Range", "")
-    index = min(work_loads, key=work_loads.get)
-    faster_client = multi_clients[index]
+    # Players seek with Range requests; plain full-file GETs and ?download=1 are bulk transfers.
+    priority = BULK if request.query_params.get("download") == "1" or not range_header else INTERACTIVE
+    is_head = request.method == "HEAD"
+    index, tg_connect = None, None
 
-    tg_connect = class_cache.get(faster_client)
-    if not tg_connect:
-        tg_connect = ByteStreamer(faster_client)
-        class_cache[faster_client] = tg_connect
-
-    file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=id)
-    if file_id.unique_id[:6] != secure_hash:
+    # HEAD only needs size, type and name: answer from cached metadata when possible
+    # and never open a stream, so probes do not count against any client's work load.
+    file_id = await file_resolver.lookup(chat_id, id) if is_head else None
+    if file_id is None:
+        known = file_resolver.peek(chat_id, id)
+        index = scheduler.pick(dc_id=known.dc_id if known else None, warm=get_warm_clients(chat_id, id))
+        tg_connect = get_streamer(index)
+        file_id = await file_resolver.resolve(tg_connect, chat_id, id)
+    if secure_hash and file_id.unique_id[:6] != secure_hash:
         raise InvalidHash
 
+    # Telegram media is immutable, so file_unique_id is a strong validator for the bytes.
+    etag = f'"{file_id.unique_id}"'
+    last_modified = getattr(file_id, "date", 0) or 0
+    validators = {"ETag": etag, "Cache-Control": "public, max-age=3600, immutable"}
+    if last_modified:
+        validators["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    precondition = check_preconditions(request, etag, last_modified)
+    if precondition == 304 and request.method in ("GET", "HEAD"):
+        return Response(status_code=304, headers=validators)
+    if precondition is not None:
+        raise HTTPException(status_code=412, detail="Precondition Failed")
+
+    if range_header and not range_applies(request, etag, last_modified):
+        range_header = ""
+
     file_size = file_id.file_size
-    from_bytes, until_bytes = parse_range_header(range_header, file_size)
+    ranges = parse_range_header(range_header, file_size)
+    if ranges is None:
+        range_header = ""
+        ranges = [(0, file_size - 1)]
+    stripes = []
+    if not is_head and any(until_bytes - from_bytes + 1 > MAX_CHUNK_SIZE for from_bytes, until_bytes in ranges):
+        stripes = await get_stripes(index, tg_connect, file_id, chat_id, id)
 
-    chunk_size = 1024 * 1024
-    offset = from_bytes - (from_bytes % chunk_size)
-    first_part_cut = from_bytes - offset
-    last_part_cut = (until_bytes % chunk_size) + 1
-    req_length = until_bytes - from_bytes + 1
-    part_count = math.ceil(until_bytes / chunk_size) - math.floor(offset / chunk_size)
+    def open_range(from_bytes: int, until_bytes: int):
+        chunk_size = get_chunk_size(from_bytes, until_bytes)
+        offset = from_bytes - (from_bytes % chunk_size)
+        first_part_cut = from_bytes - offset
+        last_part_cut = (until_bytes % chunk_size) + 1
+        part_count = (until_bytes // chunk_size) - (offset // chunk_size) + 1
 
-    body = tg_connect.yield_file(
-        file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
-    )
+        if len(stripes) > 1 and part_count > 1:
+            return yield_file_striped(
+                stripes, offset, first_part_cut, last_part_cut, part_count, chunk_size
+            )
+        return tg_connect.yield_file(
+            file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
+        )
 
     file_name = file_id.file_name or f"{secrets.token_hex(2)}.unknown"
     mime_type = file_id.mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
@@ -95,23 +261,61 @@ async def media_streamer(
 
     headers = {
         "Content-Type": mime_type,
-        "Content-Length": str(req_length),
         "Content-Disposition": f'inline; filename="{file_name}"',
         "Accept-Ranges": "bytes",
-        "Cache-Control": "public, max-age=3600, immutable",
+        **validators,
         "Access-Control-Allow-Origin": "*",
-        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges",
+        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges, ETag, Last-Modified",
     }
-    
-    if range_header:
-        headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+
+    if len(ranges) > 1:
+        boundary = secrets.token_hex(16)
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {mime_type}\r\n"
+                f"Content-Range: bytes {from_bytes}-{until_bytes}/{file_size}\r\n\r\n"
+            ).encode()
+            for from_bytes, until_bytes in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode()
+        req_length = sum(
+            len(part_header) + (until_bytes - from_bytes + 1) + 2
+            for part_header, (from_bytes, until_bytes) in zip(part_headers, ranges)
+        ) + len(closing)
+        mime_type = f"multipart/byteranges; boundary={boundary}"
+        headers["Content-Type"] = mime_type
         status_code = 206
     else:
-        status_code = 200
-    
-    return StreamingResponse(
+        from_bytes, until_bytes = ranges[0]
+        req_length = until_bytes - from_bytes + 1
+        if range_header:
+            headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+            status_code = 206
+        else:
+            status_code = 200
+
+    headers["Content-Length"] = str(req_length)
+    if is_head:
+        return Response(status_code=status_code, headers=headers)
+
+    if len(ranges) > 1:
+        body = yield_multipart(ranges, part_headers, closing, open_range)
+    else:
+        body = open_range(*ranges[0])
+    body = shaper.shape(body, request.client.host if request.client else "", priority)
+    return MediaStreamResponse(
         status_code=status_code,
         content=body,
         headers=headers,
         media_type=mime_type,
-    )
\ No newline at end of file
+    )
+
+
+async def yield_multipart(ranges, part_headers, closing: bytes, open_range):
+    for part_header, (from_bytes, until_bytes) in zip(part_headers, ranges):
+        yield part_header
+        async for chunk in open_range(from_bytes, until_bytes):
+            yield chunk
+        yield b"\r\n"
+    yield closing
@@ -225,10 +225,11 @@ async def get_catalog(media_type: str, id: str, extra: Optional[str] = None):
 
     try:
         if search_query:
-            search_results = await db.search_documents(query=search_query, page=page, page_size=PAGE_SIZE)
-            all_items = search_results.get("results", [])
             db_media_type = "tv" if media_type == "series" else "movie"
-            items = [item for item in all_items if item.get("media_type") == db_media_type]
+            search_results = await db.search_documents(
+                query=search_query, page=page, page_size=PAGE_SIZE, media_type=db_media_type
+            )
+            items = search_results.get("results", [])
         else:
             if "latest" in id:
                 sort_params = [("updated_on", "desc")]
@@ -0,0 +1,118 @@
+import asyncio
+import mmap
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple, Union
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.helper.single_flight import SingleFlight
+
+
+PART_SIZE = 1024 * 1024
+
+ChunkKey = Tuple[str, int]
+
+
+class ChunkCache:
+    # Content-addressed store of full 1 MiB parts, keyed by (file_unique_id, part_index).
+    # Parts live as one file each under `directory` and are served through mmap.
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.enabled = bool(directory) and max_size > 0
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.__entries: "OrderedDict[ChunkKey, int]" = OrderedDict()
+        self.__downloads = SingleFlight()
+        if self.enabled:
+            self.load_index()
+
+    def path_for(self, key: ChunkKey) -> str:
+        unique_id, part_index = key
+        return os.path.join(self.directory, unique_id, f"{part_index}.part")
+
+    def load_index(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for part in os.scandir(entry.path):
+                name, ext = os.path.splitext(part.name)
+                if ext != ".part" or not name.isdigit():
+                    continue
+                stat = part.stat()
+                found.append((stat.st_mtime, (entry.name, int(name)), stat.st_size))
+        for _, key, size in sorted(found):
+            self.__entries[key] = size
+            self.total_size += size
+        LOGGER.info(f"Chunk cache loaded {len(self.__entries)} parts ({self.total_size} bytes) from {self.directory}")
+        self.evict()
+
+    def read(self, key: ChunkKey) -> Optional[Union[bytes, memoryview]]:
+        if key not in self.__entries:
+            return None
+        try:
+            with open(self.path_for(key), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.forget(key)
+            return None
+        self.__entries.move_to_end(key)
+        return memoryview(mm)
+
+    def write(self, key: ChunkKey, data: bytes) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def forget(self, key: ChunkKey) -> None:
+        size = self.__entries.pop(key, None)
+        if size is not None:
+            self.total_size -= size
+
+    def evict(self) -> None:
+        while self.total_size > self.max_size and self.__entries:
+            key, size = self.__entries.popitem(last=False)
+            self.total_size -= size
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    async def store(self, key: ChunkKey, data: bytes) -> None:
+        try:
+            await asyncio.to_thread(self.write, key, data)
+        except OSError as e:
+            LOGGER.warning(f"Chunk cache write failed for {key}: {e}")
+            return
+        self.forget(key)
+        self.__entries[key] = len(data)
+        self.total_size += len(data)
+        self.evict()
+
+    async def get_or_fetch(
+        self, unique_id: str, part_index: int, fetch: Callable[[], Awaitable[bytes]]
+    ) -> Union[bytes, memoryview]:
+        key = (unique_id, part_index)
+        cached = self.read(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        # Concurrent readers of the same part share one download.
+        return await self.__downloads.do(key, lambda: self.download(key, fetch))
+
+    async def download(self, key: ChunkKey, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = await fetch()
+        if data:
+            await self.store(key, data)
+        return data
+
+
+chunk_cache = ChunkCache(Telegram.CHUNK_CACHE_DIR, Telegram.CHUNK_CACHE_SIZE_MB * 1024 * 1024)
@@ -1,114 +1,365 @@
 import asyncio
 from pyrogram import utils, raw
-from pyrogram.errors import AuthBytesInvalid
+from pyrogram.errors import (
+    BadRequest, FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid,
+    FloodWait, InternalServerError, SeeOther, ServiceUnavailable
+)
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
-from pyrogram.session import Session, Auth
-from typing import Dict, Union
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, Union
+from Backend import db
+from Backend.config import Telegram
 from Backend.logger import LOGGER
+from Backend.helper.chunk_cache import PART_SIZE, chunk_cache
 from Backend.helper.exceptions import FIleNotFound
-from Backend.helper.pyro import get_file_ids
-from Backend.pyrofork.bot import work_loads
+from Backend.helper.metrics import GETFILE_LATENCY, MEDIA_SESSION_LATENCY, StreamMetrics, record_error
+from Backend.helper.media_sessions import MediaSessionPool, get_media_pool, get_media_session
+from Backend.helper.pyro import file_id_from_location, file_location_from_id, get_file_ids
+from Backend.helper.scheduler import scheduler
+from Backend.helper.shaper import FairQueue
+from Backend.helper.single_flight import SingleFlight
+from Backend.helper.ttl_cache import TTLCache
+from Backend.pyrofork.bot import multi_clients, work_loads
 from pyrogram import Client, utils, raw
 
 
+# Upper bound on GetFile calls in flight across every stream and client.
+inflight_requests = FairQueue(Telegram.STREAM_MAX_INFLIGHT)
+part_requests = SingleFlight()
+
+FILE_REFERENCE_ERRORS = (FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid)
+TRANSIENT_ERRORS = (TimeoutError, OSError, InternalServerError, ServiceUnavailable)
+
+class_cache = {}
+
+
+async def read_parts(
+    fetch: Callable[[int, int], Awaitable[Union[bytes, memoryview]]],
+    offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int,
+    window: int = 1
+):
+    # Read-ahead window: keep up to `window` fetches in flight and hand the parts
+    # out strictly in order, trimmed to the requested byte range.
+    window = max(1, min(window, part_count))
+    pending: Deque[asyncio.Task] = deque()
+    next_offset = offset
+    scheduled = 0
+    current_part = 1
+
+    def schedule_next():
+        nonlocal next_offset, scheduled
+        pending.append(asyncio.create_task(fetch(scheduled, next_offset)))
+        next_offset += chunk_size
+        scheduled += 1
+
+    try:
+        for _ in range(window):
+            schedule_next()
+
+        while pending:
+            chunk = await pending.popleft()
+            if not chunk:
+                break
+            if scheduled < part_count:
+                schedule_next()
+
+            # Edge parts are trimmed through a memoryview so the cut does not copy the part;
+            # the server writes the view to the socket as is.
+            if part_count == 1:
+                yield memoryview(chunk)[first_part_cut:last_part_cut]
+            elif current_part == 1:
+                yield memoryview(chunk)[first_part_cut:]
+            elif current_part == part_count:
+                yield memoryview(chunk)[:last_part_cut]
+            else:
+                yield chunk
+
+            current_part += 1
+            if current_part > part_count:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def yield_file_striped(
+    stripes: List[Tuple[int, "ByteStreamer", FileId]],
+    offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int
+):
+    # Consecutive parts go round-robin to each (index, streamer, file_id) stripe,
+    # every stripe using its own client and media session.
+    LOGGER.debug(f"Starting to yield striped file with clients {[index for index, _, _ in stripes]}.")
+    sources = [StreamSource(streamer, file_id) for _, streamer, file_id in stripes]
+    metrics = StreamMetrics(stripes[0][0], stripes[0][2].dc_id)
+    try:
+        await asyncio.gather(*(source.connect() for source in sources))
+        targets = [source for source in sources if source.media_session is not None]
+        if not targets:
+            return
+
+        def fetch(part: int, part_offset: int):
+            return targets[part % len(targets)].read(part_offset, chunk_size)
+
+        async for chunk in read_parts(
+            fetch, offset, first_part_cut, last_part_cut, part_count, chunk_size,
+            window=Telegram.STREAM_PREFETCH_PARTS * len(targets)
+        ):
+            metrics.chunk(len(chunk))
+            yield chunk
+    except Exception as e:
+        LOGGER.warning(f"Striped stream ended early: {type(e).__name__}: {e}")
+    finally:
+        LOGGER.debug("Finished yielding striped file.")
+        metrics.close()
+        for source in sources:
+            source.close()
+
+
+def get_streamer(index: int) -> "ByteStreamer":
+    client = multi_clients[index]
+    tg_connect = class_cache.get(client)
+    if not tg_connect:
+        tg_connect = ByteStreamer(client, index)
+        class_cache[client] = tg_connect
+    return tg_connect
+
+
+def is_stale_file_id(file_id: FileId, error: Exception) -> bool:
+    # Expired references are refreshed for every FileId. A FileId from the location
+    # index may also belong to another bot, so any 400 on it triggers a re-resolve.
+    if not getattr(file_id, 'message', None):
+        return False
+    if isinstance(error, FILE_REFERENCE_ERRORS):
+        return True
+    return getattr(file_id, 'from_index', False) and isinstance(error, BadRequest)
+
+
+class StreamSource:
+    # What one stream needs to download a file through one client. When a part fails,
+    # read() classifies the error and repairs the source in place (fresh file
+    # reference, migrated DC or another client from multi_clients), then retries the
+    # same offset so the response carries on without a gap. The source also holds the
+    # stream's work_loads slot and moves it along on failover.
+    def __init__(self, streamer: "ByteStreamer", file_id: FileId):
+        self.streamer = streamer
+        self.file_id = file_id
+        self.media_session: Optional[MediaSessionPool] = None
+        self.location = None
+        self.failed_clients = set()
+        self.lock = asyncio.Lock()
+        work_loads[streamer.index] += 1
+
+    def close(self) -> None:
+        work_loads[self.streamer.index] -= 1
+
+    async def connect(self) -> None:
+        self.media_session = await self.streamer.generate_media_session(self.streamer.client, self.file_id)
+        self.location = await self.streamer.get_location(self.file_id)
+
+    async def read(self, offset: int, chunk_size: int) -> bytes:
+        for attempt in range(Telegram.STREAM_RETRIES + 1):
+            streamer, file_id, media_session = self.streamer, self.file_id, self.media_session
+            try:
+                if media_session is None:
+                    raise TimeoutError(f"No media session for DC {file_id.dc_id}")
+                return await streamer.get_part(file_id, media_session, self.location, offset, chunk_size)
+            except SeeOther as e:
+                if attempt == Telegram.STREAM_RETRIES:
+                    raise
+                await self.migrate(media_session, e.value)
+            except BadRequest as e:
+                if attempt == Telegram.STREAM_RETRIES or not is_stale_file_id(file_id, e):
+                    raise
+                await self.refresh(file_id, e)
+            except FloodWait as e:
+                if attempt == Telegram.STREAM_RETRIES:
+                    raise
+                if not await self.failover(streamer, e):
+                    # No other client to move to (e.g. a single bot): sit out short
+                    # waits on this one rather than ending the response.
+                    if e.value > Telegram.STREAM_FLOOD_WAIT_MAX:
+                        raise
+                    LOGGER.debug(f"FloodWait of {e.value}s on client {streamer.index}, waiting in place")
+                    await asyncio.sleep(e.value)
+            except TRANSIENT_ERRORS as e:
+                if attempt == Telegram.STREAM_RETRIES:
+                    raise
+                # Retry once on the same client, then move to another one if possible.
+                if attempt and await self.failover(streamer, e):
+                    continue
+                await asyncio.sleep(min(2 ** attempt * 0.5, 5))
+            LOGGER.debug(f"Retrying part at offset {offset} (attempt {attempt + 1})")
+
+    async def migrate(self, media_session: MediaSessionPool, dc_id: int) -> None:
+        async with self.lock:
+            if self.media_session is not media_session:
+                return
+            LOGGER.debug(f"File {self.file_id.media_id} lives on DC {dc_id}, switching media session")
+            if await get_media_session(self.streamer.client, dc_id) is not None:
+                self.media_session = get_media_pool(self.streamer.client, dc_id)
+
+    async def refresh(self, file_id: FileId, error: Exception) -> None:
+        fresh = await self.streamer.refresh_file_id(file_id, error)
+        async with self.lock:
+            if self.file_id is not file_id:
+                return
+            if fresh.dc_id != file_id.dc_id:
+                self.media_session = await self.streamer.generate_media_session(self.streamer.client, fresh)
+            self.location = await self.streamer.get_location(fresh)
+            self.file_id = fresh
+
+    async def failover(self, streamer: "ByteStreamer", error: Exception) -> bool:
+        async with self.lock:
+            if self.streamer is not streamer:
+                return True
+            self.failed_clients.add(streamer.index)
+            for index in scheduler.rank(dc_id=self.file_id.dc_id, exclude=self.failed_clients):
+                candidate = get_streamer(index)
+                try:
+                    file_id = await candidate.get_file_properties(*self.file_id.message)
+                    media_session = await candidate.generate_media_session(candidate.client, file_id)
+                except Exception as e:
+                    LOGGER.debug(f"Client {index} unusable for failover: {e}")
+                    self.failed_clients.add(index)
+                    continue
+                if media_session is None or file_id.unique_id != self.file_id.unique_id:
+                    self.failed_clients.add(index)
+                    continue
+                LOGGER.info(f"Stream moved from client {streamer.index} to {index} after {type(error).__name__}")
+                work_loads[streamer.index] -= 1
+                work_loads[index] += 1
+                self.streamer, self.file_id, self.media_session = candidate, file_id, media_session
+                self.location = await candidate.get_location(file_id)
+                return True
+            return False
+
+
 class ByteStreamer:
-    def __init__(self, client: Client):
-        self.clean_timer = 30 * 60
+    def __init__(self, client: Client, index: Optional[int] = None):
         self.client: Client = client
-        self.__cached_file_ids: Dict[int, FileId] = {}
-        asyncio.create_task(self.clean_cache())
+        self.index = index
+        self.cached_file_ids = TTLCache(Telegram.FILE_ID_CACHE_TTL, Telegram.FILE_ID_CACHE_SIZE)
 
     async def get_file_properties(self, chat_id: int, message_id: int) -> FileId:
-        if message_id not in self.__cached_file_ids:
-            file_id = await get_file_ids(self.client, int(chat_id), int(message_id))
-            if not file_id:
-                LOGGER.info('Message with ID %s not found!', message_id)
-                raise FIleNotFound
-            self.__cached_file_ids[message_id] = file_id
-        return self.__cached_file_ids[message_id]
+        return await self.cached_file_ids.get(
+            (int(chat_id), int(message_id)),
+            lambda: self.resolve_file_id(int(chat_id), int(message_id))
+        )
+
+    async def resolve_file_id(self, chat_id: int, message_id: int) -> FileId:
+        # The location index saved at ingest lets a cold stream start without get_messages.
+        location = await db.get_file_location(chat_id, message_id)
+        if location:
+            file_id = file_id_from_location(location)
+        else:
+            file_id = await self.fetch_file_id(chat_id, message_id)
+            asyncio.create_task(db.save_file_location(chat_id, message_id, file_location_from_id(file_id)))
+        setattr(file_id, 'message', (chat_id, message_id))
+        return file_id
+
+    async def fetch_file_id(self, chat_id: int, message_id: int) -> FileId:
+        file_id = await get_file_ids(self.client, chat_id, message_id)
+        if not file_id:
+            LOGGER.info('Message with ID %s not found!', message_id)
+            raise FIleNotFound
+        setattr(file_id, 'message', (chat_id, message_id))
+        return file_id
+
+    async def refresh_file_id(self, file_id: FileId, error: Exception) -> FileId:
+        # Only the first reader to see a rejected FileId re-resolves it; the rest get
+        # the fresh entry from the cache.
+        key = file_id.message
+        if self.cached_file_ids.peek(key) is file_id:
+            self.cached_file_ids.pop(key)
+        fresh = await self.cached_file_ids.get(key, lambda: self.fetch_file_id(*key))
+        if fresh is not file_id and isinstance(error, FILE_REFERENCE_ERRORS):
+            asyncio.create_task(db.save_file_location(*key, file_location_from_id(fresh)))
+        LOGGER.debug(f"Refreshed file reference for {key} on client {self.index} after {type(error).__name__}")
+        return fresh
+
+    async def fetch_part(self, file_id: FileId, media_session: MediaSessionPool, location, offset: int, chunk_size: int) -> bytes:
+        # Identical concurrent (media_id, offset, limit) reads share one GetFile call,
+        # whichever client in class_cache issued it first.
+        return await part_requests.do(
+            (file_id.media_id, offset, chunk_size),
+            lambda: self.send_get_file(media_session, location, offset, chunk_size)
+        )
+
+    async def send_get_file(self, media_session: MediaSessionPool, location, offset: int, chunk_size: int) -> bytes:
+        async with inflight_requests:
+            started = monotonic()
+            try:
+                r = await media_session.send(
+                    raw.functions.upload.GetFile(location=location, offset=offset, limit=chunk_size)
+                )
+            except (FloodWait, *TRANSIENT_ERRORS) as e:
+                scheduler.record_error(self.index, e)
+                record_error(e)
+                raise
+            except Exception as e:
+                # Stale file references and DC migrations are about the file, not the
+                # client, so they do not cool the client down.
+                record_error(e)
+                raise
+        if isinstance(r, raw.types.upload.File):
+            elapsed = monotonic() - started
+            scheduler.record_part(self.index, len(r.bytes), elapsed)
+            GETFILE_LATENCY.labels(str(self.index), str(media_session.dc_id)).observe(elapsed)
+            return r.bytes
+        return b""
+
+    async def get_part(self, file_id: FileId, media_session: MediaSessionPool, location, offset: int, chunk_size: int) -> bytes:
+        if not chunk_cache.enabled or PART_SIZE % chunk_size:
+            return await self.fetch_part(file_id, media_session, location, offset, chunk_size)
+        if chunk_size < PART_SIZE:
+            # Small probe reads are served from a cached full part when one exists.
+            cached = chunk_cache.read((file_id.unique_id, offset // PART_SIZE))
+            if cached is None:
+                return await self.fetch_part(file_id, media_session, location, offset, chunk_size)
+            start = offset % PART_SIZE
+            return cached[start:start + chunk_size]
+        return await chunk_cache.get_or_fetch(
+            file_id.unique_id, offset // PART_SIZE,
+            lambda: self.fetch_part(file_id, media_session, location, offset, chunk_size)
+        )
 
     async def yield_file(self, file_id: FileId, index: int, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int) -> Union[str, None]: # type: ignore
-        client = self.client
-        work_loads[index] += 1
         LOGGER.debug(f"Starting to yielding file with client {index}.")
-        media_session = await self.generate_media_session(client, file_id)
-        current_part = 1
-        location = await self.get_location(file_id)
+        source = StreamSource(self, file_id)
+        metrics = StreamMetrics(index, file_id.dc_id)
         try:
-            r = await media_session.send(raw.functions.upload.GetFile(location=location, offset=offset, limit=chunk_size))
-            if isinstance(r, raw.types.upload.File):
-                while True:
-                    chunk = r.bytes
-                    if not chunk:
-                        break
-                    elif part_count == 1:
-                        yield chunk[first_part_cut:last_part_cut]
-                    elif current_part == 1:
-                        yield chunk[first_part_cut:]
-                    elif current_part == part_count:
-                        yield chunk[:last_part_cut]
-                    else:
-                        yield chunk
-
-                    current_part += 1
-                    offset += chunk_size
-
-                    if current_part > part_count:
-                        break
-                    
-                    r = await media_session.send(
-                        raw.functions.upload.GetFile(
-                            location=location, offset=offset, limit=chunk_size
-                        ),
-                    )
-        except (TimeoutError, AttributeError):
-            pass
+            await source.connect()
+
+            def fetch(part: int, part_offset: int):
+                return source.read(part_offset, chunk_size)
+
+            async for chunk in read_parts(
+                fetch, offset, first_part_cut, last_part_cut, part_count, chunk_size,
+                window=Telegram.STREAM_PREFETCH_PARTS
+            ):
+                metrics.chunk(len(chunk))
+                yield chunk
+        except Exception as e:
+            LOGGER.warning(f"Stream on client {source.streamer.index} ended early: {type(e).__name__}: {e}")
         finally:
-            LOGGER.debug("Finished yielding file with {current_part} parts.")
-            work_loads[index] -= 1
+            LOGGER.debug(f"Finished yielding file with client {source.streamer.index}.")
+            metrics.close()
+            source.close()
 
-    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
-        media_session = client.media_sessions.get(file_id.dc_id, None)
+    async def generate_media_session(self, client: Client, file_id: FileId) -> Optional[MediaSessionPool]:
+        outcome = "cached" if file_id.dc_id in client.media_sessions else "created"
+        started = monotonic()
+        media_session = None
+        try:
+            media_session = await get_media_session(client, file_id.dc_id)
+        finally:
+            if media_session is None:
+                outcome = "failed"
+            MEDIA_SESSION_LATENCY.labels(str(file_id.dc_id), outcome).observe(monotonic() - started)
         if media_session is None:
-            if file_id.dc_id != await client.storage.dc_id():
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await Auth(client, file_id.dc_id, await client.storage.test_mode()).create(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-                for _ in range(6):
-                    exported_auth = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id))
-                    try:
-                        
-                        await media_session.send(raw.functions.auth.ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes))
-                        break
-                    except AuthBytesInvalid:
-                        LOGGER.debug(f"Invalid authorization bytes for DC {file_id.dc_id}, retrying...")
-                    except OSError:
-                        LOGGER.debug(f"Connection error, retrying...")
-                        await asyncio.sleep(2)
-                else:
-                    await media_session.stop()
-                    LOGGER.debug(f"Failed to establish media session for DC {file_id.dc_id} after multiple retries")
-                    return None 
-            else:
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await client.storage.auth_key(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-            LOGGER.debug(f"Created media session for DC {file_id.dc_id}")
-            client.media_sessions[file_id.dc_id] = media_session
-        else:
-            LOGGER.debug(f"Using cached media session for DC {file_id.dc_id}")
-        return media_session
-
+            return None
+        return get_media_pool(client, file_id.dc_id)
 
     @staticmethod
     async def get_location(file_id: FileId) -> Union[raw.types.InputPhotoFileLocation, raw.types.InputDocumentFileLocation, raw.types.InputPeerPhotoFileLocation]:
@@ -138,9 +389,3 @@ class ByteStreamer:
                                                            file_reference=file_id.file_reference,
                                                            thumb_size=file_id.thumbnail_size)
         return location
-
-    async def clean_cache(self) -> None:
-        while True:
-            await asyncio.sleep(self.clean_timer)
-            self.__cached_file_ids.clear()
-            LOGGER.debug("Cleaned the cache")
@@ -1,9 +1,11 @@
-from asyncio import create_task
+import heapq
+from asyncio import create_task, gather
 from bson import ObjectId
+from itertools import islice
 import motor.motor_asyncio
 from datetime import datetime
 from pydantic import ValidationError
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
 from typing import Dict, List, Optional, Tuple, Any
 
 from Backend.logger import LOGGER
@@ -11,6 +13,8 @@ from Backend.config import Telegram
 import re
 from Backend.helper.encrypt import decode_string, encode_string
 from Backend.helper.modal import Episode, MovieSchema, QualityDetail, Season, TVShowSchema
+from Backend.helper.search import SEARCH_VERSION, document_search_fields, fold_text, query_grams
+from Backend.helper.ttl_cache import TTLCache
 from Backend.helper.task_manager import delete_message
 
 
@@ -25,6 +29,41 @@ def convert_objectid_to_str(document: Dict[str, Any]) -> Dict[str, Any]:
     return document
 
 
+PAGE_CURSOR_TTL = 600
+PAGE_CURSOR_ENTRIES = 4096
+ROUTE_BATCH = 1000
+SEARCH_BATCH = 500
+
+# Indexes every storage_N movie/tv collection needs: upsert and admin lookups by id or
+# title+year, the catalog sorts (with the _id tiebreak the paginator uses), with and
+# without a genre filter, and the trigram index behind search_documents.
+STORAGE_INDEXES = [
+    IndexModel([("tmdb_id", ASCENDING)], name="tmdb_id"),
+    IndexModel([("imdb_id", ASCENDING)], name="imdb_id"),
+    IndexModel([("title", ASCENDING), ("release_year", ASCENDING)], name="title_release_year"),
+    IndexModel([("updated_on", DESCENDING), ("_id", DESCENDING)], name="updated_on"),
+    IndexModel([("rating", DESCENDING), ("_id", DESCENDING)], name="rating"),
+    IndexModel([("genres", ASCENDING), ("updated_on", DESCENDING), ("_id", DESCENDING)], name="genres_updated_on"),
+    IndexModel([("genres", ASCENDING), ("rating", DESCENDING), ("_id", DESCENDING)], name="genres_rating"),
+    IndexModel([("search_grams", ASCENDING)], name="search_grams"),
+]
+
+
+# Top-level fields catalog and list views render (convert_to_stremio_meta and the
+# admin media grid); seasons, episodes and quality entries stay in Mongo.
+CATALOG_PROJECTION = {
+    "_id": 1, "tmdb_id": 1, "imdb_id": 1, "title": 1, "media_type": 1, "db_index": 1,
+    "release_year": 1, "poster": 1, "backdrop": 1, "logo": 1, "genres": 1,
+    "rating": 1, "description": 1, "cast": 1, "runtime": 1, "updated_on": 1,
+}
+# Whole documents for detail and edit views, minus the derived search fields.
+DOCUMENT_PROJECTION = {"search_title": 0, "search_text": 0, "search_grams": 0, "search_version": 0}
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", title.casefold()).split())
+
+
 class Database:
     def __init__(self, db_name: str = "dbFyvio"):
         self.db_uris = Telegram.DATABASE
@@ -37,6 +76,8 @@ class Database:
         self.dbs: Dict[str, motor.motor_asyncio.AsyncIOMotorDatabase] = {}
 
         self.current_db_index = 1
+        self.page_cursors = TTLCache(PAGE_CURSOR_TTL, PAGE_CURSOR_ENTRIES)
+        self.routes_ready = False
 
     async def connect(self):
         try:
@@ -61,6 +102,17 @@ class Database:
 
             LOGGER.info(f"Active storage DB: storage_{self.current_db_index}")
 
+            create_task(self.ensure_indexes())
+
+            routes_state = await self.dbs["tracking"]["state"].find_one({"_id": "media_routes"})
+            self.routes_ready = bool(routes_state and routes_state.get("ready"))
+            if not self.routes_ready:
+                create_task(self.build_media_routes())
+
+            search_state = await self.dbs["tracking"]["state"].find_one({"_id": "search_index"})
+            if not search_state or search_state.get("version") != SEARCH_VERSION:
+                create_task(self.build_search_index())
+
         except Exception as e:
             LOGGER.error(f"Database connection error: {e}")
 
@@ -86,61 +138,86 @@ class Database:
             return {sort_field: DESCENDING if sort_direction.lower() == "desc" else ASCENDING}
         return {"updated_on": DESCENDING}
 
+    def _sort_key(self, field: str):
+        # Python mirror of Mongo's (field, _id) order; missing values sort lowest as in Mongo.
+        return lambda item: (item[1].get(field) is not None, item[1].get(field), item[1]["_id"])
+
+    def _seek_filter(self, filter_dict: dict, field: str, direction: int, boundary: Tuple[Any, ObjectId]) -> dict:
+        # Null and missing values sort first ascending and last descending, so they
+        # either follow a non-null boundary or precede every non-null value.
+        value, last_id = boundary
+        op = "$lt" if direction == DESCENDING else "$gt"
+        if value is None:
+            seek = {"$or": [{field: None, "_id": {op: last_id}}]}
+            if direction == ASCENDING:
+                seek["$or"].append({field: {"$ne": None}})
+        else:
+            seek = {"$or": [{field: {op: value}}, {field: value, "_id": {op: last_id}}]}
+            if direction == DESCENDING:
+                seek["$or"].append({field: None})
+        return {"$and": [filter_dict, seek]} if filter_dict else seek
+
     async def _paginate_collection(
         self,
         collection_name: str,
         sort_dict: Dict[str, int],
         page: int,
         page_size: int,
-        filter_dict: Optional[dict] = None
+        filter_dict: Optional[dict] = None,
+        projection: Optional[dict] = None
     ):
+        # Scatter-gather: every storage DB is counted and queried at once, and the
+        # per-shard pages are k-way merged on (sort field, _id). The last key of each
+        # served page is kept as a keyset cursor, so the next page seeks past it on
+        # every shard instead of skipping; pages without a cursor seek from the
+        # nearest earlier one and skip only the gap.
         filter_dict = filter_dict or {}
-        skip = (page - 1) * page_size
-        results = []
-        dbs_checked = []
-        total_count = 0
-
-        db_counts = []
-        for i in range(1, self.current_db_index + 1):
-            db_key = f"storage_{i}"
-            db = self.dbs[db_key]
-            count = await db[collection_name].count_documents(filter_dict)
-            db_counts.append((i, count))
-            total_count += count
-
-        start_db_index = None
-        for db_index, count in reversed(db_counts):
-            if skip < count:
-                start_db_index = db_index
+        field, direction = next(iter(sort_dict.items()))
+        if projection is not None:
+            # The merge and the keyset cursor read the sort field back.
+            projection = {**projection, field: 1}
+        storage_indexes = range(1, self.current_db_index + 1)
+        cursor_key = (collection_name, repr(filter_dict), field, direction, page_size)
+
+        boundary, from_page = None, 0
+        for previous in range(page - 1, 0, -1):
+            boundary = self.page_cursors.peek(cursor_key + (previous,))
+            if boundary is not None:
+                from_page = previous
                 break
-            skip -= count
-
-        if not start_db_index:
-            return [], [], total_count
+        query = self._seek_filter(filter_dict, field, direction, boundary) if boundary else filter_dict
+        offset = (page - 1 - from_page) * page_size
+        limit = offset + page_size
 
-        for db_index, count in reversed(db_counts):
-            if db_index < start_db_index:
-                continue
-
-            db_key = f"storage_{db_index}"
-            db = self.dbs[db_key]
-            dbs_checked.append(db_index)
+        async def count(db_index: int) -> int:
+            collection = self.dbs[f"storage_{db_index}"][collection_name]
+            if filter_dict:
+                return await collection.count_documents(filter_dict)
+            return await collection.estimated_document_count()
 
+        async def fetch(db_index: int) -> List[Tuple[int, dict]]:
             cursor = (
-                db[collection_name]
-                .find(filter_dict)
-                .sort(sort_dict)
-                .skip(skip if db_index == start_db_index else 0)
-                .limit(page_size - len(results))
+                self.dbs[f"storage_{db_index}"][collection_name]
+                .find(query, projection)
+                .sort([(field, direction), ("_id", direction)])
+                .limit(limit)
             )
+            return [(db_index, doc) for doc in await cursor.to_list(limit)]
 
-            docs = await cursor.to_list(None)
-            results.extend(docs)
+        counts, pages = await gather(
+            gather(*(count(i) for i in storage_indexes)),
+            gather(*(fetch(i) for i in storage_indexes)),
+        )
+        merged = heapq.merge(*pages, key=self._sort_key(field), reverse=direction == DESCENDING)
+        page_items = list(islice(merged, offset, limit))
 
-            if len(results) >= page_size:
-                break
+        if len(page_items) == page_size:
+            last = page_items[-1][1]
+            self.page_cursors.set(cursor_key + (page,), (last.get(field), last["_id"]))
 
-        return results, dbs_checked, total_count
+        results = [doc for _, doc in page_items]
+        dbs_checked = sorted({db_index for db_index, _ in page_items})
+        return results, dbs_checked, sum(counts)
 
 
 
@@ -150,9 +227,11 @@ class Database:
         current_db_key = f"storage_{self.current_db_index}"
         old_db_key = f"storage_{old_db_index}"
         document["db_index"] = self.current_db_index
+        self._with_search_fields(collection_name, document)
         try:
             await self.dbs[current_db_key][collection_name].insert_one(document)
             await self.dbs[old_db_key][collection_name].delete_one({"_id": document["_id"]})
+            await self._save_routes(collection_name, document, self.current_db_index)
             LOGGER.info(f"✅ Moved document {document.get('tmdb_id')} from {old_db_key} to {current_db_key}")
             return True
         except Exception as e:
@@ -170,6 +249,170 @@ class Database:
         return await func(*args)
 
 
+    # -------------------------------
+    # Media Routing Index
+    # -------------------------------
+    # tracking.media_routes maps imdb_id, tmdb_id and normalised title+year to the
+    # storage DB and _id of the document, so an upsert finds its target with one
+    # lookup instead of probing every storage DB.
+    def _route_keys(self, collection_name: str, imdb_id, tmdb_id, title, release_year) -> List[str]:
+        keys = []
+        if imdb_id:
+            keys.append(f"{collection_name}:imdb:{imdb_id}")
+        if tmdb_id:
+            keys.append(f"{collection_name}:tmdb:{tmdb_id}")
+        if title and release_year:
+            keys.append(f"{collection_name}:title:{normalize_title(title)}:{release_year}")
+        return keys
+
+    def _document_route_keys(self, collection_name: str, document: dict) -> List[str]:
+        return self._route_keys(
+            collection_name, document.get("imdb_id"), document.get("tmdb_id"),
+            document.get("title"), document.get("release_year")
+        )
+
+    async def _save_routes(self, collection_name: str, document: dict, db_index: int) -> None:
+        keys = self._document_route_keys(collection_name, document)
+        if not keys:
+            return
+        try:
+            await self.dbs["tracking"]["media_routes"].bulk_write([
+                UpdateOne(
+                    {"_id": key},
+                    {"$set": {"db_index": db_index, "doc_id": document["_id"]}},
+                    upsert=True
+                )
+                for key in keys
+            ], ordered=False)
+        except Exception as e:
+            LOGGER.error(f"Failed to save routes for {collection_name} {document.get('tmdb_id')}: {e}")
+
+    async def update_media_routes(self, collection_name: str, document: dict, db_index: int) -> None:
+        # For writers outside Database that change imdb_id/tmdb_id/title/release_year
+        # in place; routes for the old keys are dropped lazily by _find_existing.
+        await self._save_routes(collection_name, document, db_index)
+
+    async def _drop_routes(self, collection_name: str, document: dict) -> None:
+        try:
+            await self.dbs["tracking"]["media_routes"].delete_many({
+                "_id": {"$in": self._document_route_keys(collection_name, document)},
+                "doc_id": document["_id"]
+            })
+        except Exception as e:
+            LOGGER.error(f"Failed to drop routes for {collection_name} {document.get('tmdb_id')}: {e}")
+
+    async def _probe_storage(self, collection_name: str, imdb_id, tmdb_id, title, release_year):
+        # The original lookup, used until the routing index is built or when it is stale.
+        total_storage_dbs = len(self.dbs) - 1
+        for db_index in range(1, total_storage_dbs + 1):
+            collection = self.dbs[f"storage_{db_index}"][collection_name]
+            document = None
+            if imdb_id:
+                document = await collection.find_one({"imdb_id": imdb_id})
+            if not document and tmdb_id:
+                document = await collection.find_one({"tmdb_id": tmdb_id})
+            if not document and title and release_year:
+                document = await collection.find_one({"title": title, "release_year": release_year})
+            if document:
+                await self._save_routes(collection_name, document, db_index)
+                return db_index, document
+        return None, None
+
+    async def _find_existing(self, collection_name: str, imdb_id, tmdb_id, title, release_year):
+        keys = self._route_keys(collection_name, imdb_id, tmdb_id, title, release_year)
+        routes_collection = self.dbs["tracking"]["media_routes"]
+        routes = {route["_id"]: route async for route in routes_collection.find({"_id": {"$in": keys}})}
+
+        stale = False
+        for key in keys:
+            route = routes.get(key)
+            if not route:
+                continue
+            document = await self.dbs[f"storage_{route['db_index']}"][collection_name].find_one({"_id": route["doc_id"]})
+            # Documents can be edited or moved behind the index's back; trust a route
+            # only if the document it points at still carries the key.
+            if document and key in self._document_route_keys(collection_name, document):
+                return route["db_index"], document
+            stale = True
+            await routes_collection.delete_one({"_id": key, "doc_id": route["doc_id"]})
+
+        if self.routes_ready and not stale:
+            return None, None
+        return await self._probe_storage(collection_name, imdb_id, tmdb_id, title, release_year)
+
+    async def build_media_routes(self) -> None:
+        # One-off backfill for documents stored before the index existed.
+        try:
+            total = 0
+            projection = {"imdb_id": 1, "tmdb_id": 1, "title": 1, "release_year": 1}
+            for db_index in range(1, len(self.dbs)):
+                for collection_name in ("movie", "tv"):
+                    operations = []
+                    async for document in self.dbs[f"storage_{db_index}"][collection_name].find({}, projection):
+                        operations.extend(
+                            UpdateOne(
+                                {"_id": key},
+                                {"$set": {"db_index": db_index, "doc_id": document["_id"]}},
+                                upsert=True
+                            )
+                            for key in self._document_route_keys(collection_name, document)
+                        )
+                        if len(operations) >= ROUTE_BATCH:
+                            await self.dbs["tracking"]["media_routes"].bulk_write(operations, ordered=False)
+                            total += len(operations)
+                            operations = []
+                    if operations:
+                        await self.dbs["tracking"]["media_routes"].bulk_write(operations, ordered=False)
+                        total += len(operations)
+            await self.dbs["tracking"]["state"].update_one(
+                {"_id": "media_routes"}, {"$set": {"ready": True}}, upsert=True
+            )
+            self.routes_ready = True
+            LOGGER.info(f"Media routing index built with {total} routes")
+        except Exception as e:
+            LOGGER.error(f"Failed to build media routing index: {e}")
+
+
+    # -------------------------------
+    # Search Index
+    # -------------------------------
+    # Every movie/tv document carries its folded title, the folded title plus file
+    # names, and the trigrams of that text. search_documents narrows candidates through
+    # the multikey search_grams index and confirms the words on search_text.
+    def _with_search_fields(self, collection_name: str, document: dict) -> dict:
+        document.update(document_search_fields(collection_name, document))
+        return document
+
+    async def build_search_index(self) -> None:
+        # Backfill for documents stored before the search fields existed or with an
+        # older SEARCH_VERSION; they do not show up in search until this finishes.
+        try:
+            total = 0
+            projection = {"title": 1, "telegram.name": 1, "seasons.episodes.telegram.name": 1}
+            for db_index in range(1, len(self.dbs)):
+                for collection_name in ("movie", "tv"):
+                    collection = self.dbs[f"storage_{db_index}"][collection_name]
+                    operations = []
+                    async for document in collection.find({"search_version": {"$ne": SEARCH_VERSION}}, projection):
+                        operations.append(UpdateOne(
+                            {"_id": document["_id"]},
+                            {"$set": document_search_fields(collection_name, document)}
+                        ))
+                        if len(operations) >= SEARCH_BATCH:
+                            await collection.bulk_write(operations, ordered=False)
+                            total += len(operations)
+                            operations = []
+                    if operations:
+                        await collection.bulk_write(operations, ordered=False)
+                        total += len(operations)
+            await self.dbs["tracking"]["state"].update_one(
+                {"_id": "search_index"}, {"$set": {"version": SEARCH_VERSION}}, upsert=True
+            )
+            LOGGER.info(f"Search index built, {total} documents updated")
+        except Exception as e:
+            LOGGER.error(f"Failed to build search index: {e}")
+
+
     # -------------------------------
     # Multi Database Method for insert/update/delete/list
     # -------------------------------
@@ -254,33 +497,15 @@ class Database:
         current_db_key = f"storage_{self.current_db_index}"
 
         total_storage_dbs = len(self.dbs) - 1  
-        existing_db_key = None
-        existing_db_index = None
-        existing_movie = None
-
-        
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            movie = None
-            if imdb_id:
-                movie = await self.dbs[db_key]["movie"].find_one({"imdb_id": imdb_id})
-            if not movie and tmdb_id:
-                movie = await self.dbs[db_key]["movie"].find_one({"tmdb_id": tmdb_id})
-            if not movie and title and release_year:
-                movie = await self.dbs[db_key]["movie"].find_one({
-                    "title": title, 
-                    "release_year": release_year
-                })
-            if movie:
-                existing_db_key = db_key
-                existing_db_index = db_index
-                existing_movie = movie
-                break
+        existing_db_index, existing_movie = await self._find_existing("movie", imdb_id, tmdb_id, title, release_year)
+        existing_db_key = f"storage_{existing_db_index}" if existing_movie else None
 
         if not existing_movie:
             try:
                 movie_dict["db_index"] = self.current_db_index
+                self._with_search_fields("movie", movie_dict)
                 result = await self.dbs[current_db_key]["movie"].insert_one(movie_dict)
+                await self._save_routes("movie", movie_dict, self.current_db_index)
                 return result.inserted_id
             except Exception as e:
                 LOGGER.error(f"Insertion failed in {current_db_key}: {e}")
@@ -300,6 +525,7 @@ class Database:
                     chat_id = int(f"-100{decoded_data['chat_id']}")
                     msg_id = int(decoded_data['msg_id'])
                     create_task(delete_message(chat_id, msg_id))
+                    create_task(self.delete_file_location(chat_id, msg_id))
             except Exception as e:
                 LOGGER.error(f"Failed to queue old quality file for deletion: {e}")
 
@@ -308,6 +534,7 @@ class Database:
             existing_qualities.append(quality_to_update)
         existing_movie["telegram"] = existing_qualities
         existing_movie["updated_on"] = datetime.utcnow()
+        self._with_search_fields("movie", existing_movie)
 
         if existing_db_index != self.current_db_index:
             try:
@@ -340,32 +567,15 @@ class Database:
         current_db_key = f"storage_{self.current_db_index}"
         total_storage_dbs = len(self.dbs) - 1
 
-        existing_db_key = None
-        existing_db_index = None
-        existing_tv = None
-
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            tv = None
-            if imdb_id:
-                tv = await self.dbs[db_key]["tv"].find_one({"imdb_id": imdb_id})
-            if not tv and tmdb_id:
-                tv = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
-            if not tv and title and release_year:
-                tv = await self.dbs[db_key]["tv"].find_one({
-                    "title": title,
-                    "release_year": release_year
-                })
-            if tv:
-                existing_db_key = db_key
-                existing_db_index = db_index
-                existing_tv = tv
-                break
+        existing_db_index, existing_tv = await self._find_existing("tv", imdb_id, tmdb_id, title, release_year)
+        existing_db_key = f"storage_{existing_db_index}" if existing_tv else None
 
         if not existing_tv:
             try:
                 tv_show_dict["db_index"] = self.current_db_index
+                self._with_search_fields("tv", tv_show_dict)
                 result = await self.dbs[current_db_key]["tv"].insert_one(tv_show_dict)
+                await self._save_routes("tv", tv_show_dict, self.current_db_index)
                 return result.inserted_id
             except Exception as e:
                 LOGGER.error(f"Insertion failed in {current_db_key}: {e}")
@@ -401,6 +611,7 @@ class Database:
                                         chat_id = int(f"-100{decoded_data['chat_id']}")
                                         msg_id = int(decoded_data['msg_id'])
                                         create_task(delete_message(chat_id, msg_id))
+                                        create_task(self.delete_file_location(chat_id, msg_id))
                                         
                                 except Exception as e:
                                     LOGGER.error(f"Failed to queue old quality file for deletion: {e}")
@@ -412,6 +623,7 @@ class Database:
             else:
                 existing_tv["seasons"].append(season)
         existing_tv["updated_on"] = datetime.utcnow()
+        self._with_search_fields("tv", existing_tv)
 
         if existing_db_index != self.current_db_index:
             try:
@@ -431,11 +643,12 @@ class Database:
             if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
                 return await self._handle_storage_error(self.update_tv_show, tv_show_data, total_storage_dbs=total_storage_dbs)
     
-    async def sort_movies(self, sort_params, page, page_size, genre_filter=None):
+    async def sort_movies(self, sort_params, page, page_size, genre_filter=None, projection=CATALOG_PROJECTION):
+        # projection=None returns whole documents.
         sort_dict = self._get_sort_dict(sort_params)
         filter_dict = {"genres": {"$in": [genre_filter]}} if genre_filter else {}
         results, dbs_checked, total_count = await self._paginate_collection(
-            "movie", sort_dict, page, page_size, filter_dict=filter_dict
+            "movie", sort_dict, page, page_size, filter_dict=filter_dict, projection=projection
         )
         total_pages = (total_count + page_size - 1) // page_size
         return {
@@ -446,11 +659,12 @@ class Database:
             "movies": [convert_objectid_to_str(result) for result in results],
         }
 
-    async def sort_tv_shows(self, sort_params, page, page_size, genre_filter=None):
+    async def sort_tv_shows(self, sort_params, page, page_size, genre_filter=None, projection=CATALOG_PROJECTION):
+        # projection=None returns whole documents.
         sort_dict = self._get_sort_dict(sort_params)
         filter_dict = {"genres": {"$in": [genre_filter]}} if genre_filter else {}
         results, dbs_checked, total_count = await self._paginate_collection(
-            "tv", sort_dict, page, page_size, filter_dict=filter_dict
+            "tv", sort_dict, page, page_size, filter_dict=filter_dict, projection=projection
         )
         total_pages = (total_count + page_size - 1) // page_size
         return {
@@ -464,101 +678,87 @@ class Database:
 
 
     async def search_documents(
-            self, 
-            query: str, 
-            page: int, 
-            page_size: int
-        ) -> dict:
-
-            skip = (page - 1) * page_size
-            
-            words = query.split()
-            regex_query = {
-                '$regex': '.*' + '.*'.join(words) + '.*', 
-                '$options': 'i'
-            }
-            
-            tv_pipeline = [
-                {"$match": {"$or": [
-                    {"title": regex_query},
-                    {"seasons.episodes.telegram.name": regex_query}
-                ]}},
-                {"$project": {
-                    "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1, "imdb_id": 1,
-                    "release_year": 1, "poster": 1, "backdrop": 1, "description": 1, "logo": 1,
-                    "media_type": 1, "db_index": 1
-                }}
-            ]
-            
-            movie_pipeline = [
-                {"$match": {"$or": [
-                    {"title": regex_query},
-                    {"telegram.name": regex_query}
-                ]}},
-                {"$project": {
-                    "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1,
-                    "release_year": 1, "poster": 1, "backdrop": 1, "description": 1,
-                    "media_type": 1, "db_index": 1, "imdb_id": 1, "logo": 1
-                }}
-            ]
-            
-            results = []
-            dbs_checked = []
-            
-            active_db_key = f"storage_{self.current_db_index}"
-            active_db = self.dbs[active_db_key]
-            dbs_checked.append(self.current_db_index)
-            
-            tv_results = await active_db["tv"].aggregate(tv_pipeline).to_list(None)
-            movie_results = await active_db["movie"].aggregate(movie_pipeline).to_list(None)
-            combined = tv_results + movie_results
-            results.extend(combined)
-            
-            if len(results) < page_size:
-                previous_db_index = self.current_db_index - 1
-                while previous_db_index > 0 and len(results) < page_size:
-                    prev_db_key = f"storage_{previous_db_index}"
-                    prev_db = self.dbs[prev_db_key]
-                    tv_results_prev = await prev_db["tv"].aggregate(tv_pipeline).to_list(None)
-                    movie_results_prev = await prev_db["movie"].aggregate(movie_pipeline).to_list(None)
-                    combined_prev = tv_results_prev + movie_results_prev
-                    results.extend(combined_prev)
-                    dbs_checked.append(previous_db_index)
-                    previous_db_index -= 1
-
-            total_count = 0
-            for db_index in dbs_checked:
-                key = f"storage_{db_index}"
-                db = self.dbs[key]
-                tv_count = await db["tv"].count_documents({
-                    "$or": [
-                        {"title": regex_query},
-                        {"seasons.episodes.telegram.name": regex_query}
-                    ]
-                })
-                movie_count = await db["movie"].count_documents({
-                    "$or": [
-                        {"title": regex_query},
-                        {"telegram.name": regex_query}
-                    ]
-                })
-                total_count += (tv_count + movie_count)
-            
-            paged_results = results[skip:skip + page_size]
+        self,
+        query: str,
+        page: int,
+        page_size: int,
+        media_type: Optional[str] = None
+    ) -> dict:
+        skip = (page - 1) * page_size
+        folded = fold_text(query)
+        words = folded.split()
+        if not words:
+            return {"total_count": 0, "results": []}
+
+        match = {"$and": [{"search_text": {"$regex": re.escape(word)}} for word in words]}
+        grams = query_grams(words)
+        if grams:
+            match["search_grams"] = {"$all": grams}
+
+        # Exact title, title prefix, phrase in title, all words in title, file name only.
+        title_position = {"$indexOfCP": ["$search_title", folded]}
+        score = {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$search_title", folded]}, "then": 4},
+                {"case": {"$eq": [title_position, 0]}, "then": 3},
+                {"case": {"$gt": [title_position, 0]}, "then": 2},
+                {"case": {"$and": [
+                    {"$gte": [{"$indexOfCP": ["$search_title", word]}, 0]} for word in words
+                ]}, "then": 1},
+            ],
+            "default": 0
+        }}
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {"score": score}},
+            {"$facet": {
+                "results": [
+                    {"$sort": {"score": DESCENDING, "rating": DESCENDING, "_id": DESCENDING}},
+                    {"$limit": skip + page_size},
+                    {"$project": {**CATALOG_PROJECTION, "score": 1}}
+                ],
+                "total": [{"$count": "count"}]
+            }}
+        ]
+
+        collection_names = [media_type] if media_type in ("movie", "tv") else ["tv", "movie"]
+
+        async def run(db_index: int, collection_name: str) -> dict:
+            facets = await self.dbs[f"storage_{db_index}"][collection_name].aggregate(pipeline).to_list(1)
+            return facets[0] if facets else {"results": [], "total": []}
+
+        facets = await gather(*(
+            run(db_index, collection_name)
+            for db_index in range(1, len(self.dbs))
+            for collection_name in collection_names
+        ))
+
+        total_count = sum(facet["total"][0]["count"] for facet in facets if facet["total"])
+        # Each shard returned its best skip + page_size, so the global page is among them.
+        results = sorted(
+            (doc for facet in facets for doc in facet["results"]),
+            key=lambda doc: (doc["score"], doc.get("rating") or 0, doc["_id"]),
+            reverse=True
+        )[skip:skip + page_size]
+        for doc in results:
+            doc.pop("score", None)
 
-            return {
-                "total_count": total_count,
-                "results": [convert_objectid_to_str(doc) for doc in paged_results]
-            }
+        return {
+            "total_count": total_count,
+            "results": [convert_objectid_to_str(doc) for doc in results]
+        }
 
 
     async def get_media_details(
         self, tmdb_id: int, db_index: int,
         season_number: Optional[int] = None, episode_number: Optional[int] = None
     ) -> Optional[dict]:
+        # Full-document path for detail views; season and episode lookups fetch only
+        # the matching season.
         db_key = f"storage_{db_index}"
+        season_projection = {"seasons": {"$elemMatch": {"season_number": season_number}}}
         if episode_number is not None and season_number is not None:
-            tv_show = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
+            tv_show = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id}, season_projection)
             if not tv_show:
                 return None
             for season in tv_show.get("seasons", []):
@@ -577,7 +777,7 @@ class Database:
             return None
 
         elif season_number is not None:
-            tv_show = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
+            tv_show = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id}, season_projection)
             if not tv_show:
                 return None
             for season in tv_show.get("seasons", []):
@@ -592,12 +792,12 @@ class Database:
             return None
 
         else:
-            tv_doc = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
+            tv_doc = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id}, DOCUMENT_PROJECTION)
             if tv_doc:
                 tv_doc = convert_objectid_to_str(tv_doc)
                 tv_doc["type"] = "tv"
                 return tv_doc
-            movie_doc = await self.dbs[db_key]["movie"].find_one({"tmdb_id": tmdb_id})
+            movie_doc = await self.dbs[db_key]["movie"].find_one({"tmdb_id": tmdb_id}, DOCUMENT_PROJECTION)
             if movie_doc:
                 movie_doc = convert_objectid_to_str(movie_doc)
                 movie_doc["type"] = "movie"
@@ -616,7 +816,7 @@ class Database:
             collection_name = "tv"
         else:
             collection_name = "movie"
-        document = await self.dbs[db_key][collection_name].find_one({"tmdb_id": int(tmdb_id)})
+        document = await self.dbs[db_key][collection_name].find_one({"tmdb_id": int(tmdb_id)}, DOCUMENT_PROJECTION)
         return convert_objectid_to_str(document) if document else None
 
     async def update_document(
@@ -632,6 +832,17 @@ class Database:
 
         try:
             result = await collection.update_one({"tmdb_id": int(tmdb_id)}, {"$set": update_data})
+            route_changed = bool({"imdb_id", "tmdb_id", "title", "release_year"} & update_data.keys())
+            search_changed = bool({"title", "telegram", "seasons"} & update_data.keys())
+            if result.modified_count > 0 and (route_changed or search_changed):
+                document = await collection.find_one({"tmdb_id": int(update_data.get("tmdb_id", tmdb_id))})
+                if document and route_changed:
+                    await self._save_routes(collection_name, document, int(db_index))
+                if document and search_changed:
+                    await collection.update_one(
+                        {"_id": document["_id"]},
+                        {"$set": document_search_fields(collection_name, document)}
+                    )
 
             return result.modified_count > 0
 
@@ -658,7 +869,9 @@ class Database:
                     old_doc.update(update_data)
                     old_doc["db_index"] = next_db_index
                     old_doc.pop("_id", None)
+                    self._with_search_fields(collection_name, old_doc)
                     insert_result = await self.dbs[new_db_key][collection_name].insert_one(old_doc)
+                    await self._save_routes(collection_name, old_doc, next_db_index)
                     LOGGER.info(f"Inserted document {insert_result.inserted_id} into {new_db_key}")
                     await self.dbs[db_key][collection_name].delete_one({"tmdb_id": int(tmdb_id)})
                     LOGGER.info(f"Deleted document tmdb_id {tmdb_id} from {db_key}")
@@ -686,10 +899,13 @@ class Database:
                             chat_id = int(f"-100{decoded_data['chat_id']}")
                             msg_id = int(decoded_data['msg_id'])
                             create_task(delete_message(chat_id, msg_id))
+                            create_task(self.delete_file_location(chat_id, msg_id))
                     except Exception as e:
                         LOGGER.error(f"Failed to queue file for deletion: {e}")
             
             result = await self.dbs[db_key]["movie"].delete_one({"tmdb_id": tmdb_id})
+            if doc and result.deleted_count:
+                await self._drop_routes("movie", doc)
         else:
             doc = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
             if doc and "seasons" in doc:
@@ -703,10 +919,13 @@ class Database:
                                     chat_id = int(f"-100{decoded_data['chat_id']}")
                                     msg_id = int(decoded_data['msg_id'])
                                     create_task(delete_message(chat_id, msg_id))
+                                    create_task(self.delete_file_location(chat_id, msg_id))
                             except Exception as e:
                                 LOGGER.error(f"Failed to queue file for deletion: {e}")
             
             result = await self.dbs[db_key]["tv"].delete_one({"tmdb_id": tmdb_id})
+            if doc and result.deleted_count:
+                await self._drop_routes("tv", doc)
         
         if result.deleted_count > 0:
             LOGGER.info(f"{media_type} with tmdb_id {tmdb_id} deleted successfully.")
@@ -730,6 +949,7 @@ class Database:
                         chat_id = int(f"-100{decoded_data['chat_id']}")
                         msg_id = int(decoded_data['msg_id'])
                         create_task(delete_message(chat_id, msg_id))
+                        create_task(self.delete_file_location(chat_id, msg_id))
                 except Exception as e:
                     LOGGER.error(f"Failed to queue file for deletion: {e}")
                 break
@@ -741,6 +961,7 @@ class Database:
             return False
         
         movie['updated_on'] = datetime.utcnow()
+        self._with_search_fields("movie", movie)
         result = await self.dbs[db_key]["movie"].replace_one({"tmdb_id": tmdb_id}, movie)
         return result.modified_count > 0
 
@@ -764,6 +985,7 @@ class Database:
                                     chat_id = int(f"-100{decoded_data['chat_id']}")
                                     msg_id = int(decoded_data['msg_id'])
                                     create_task(delete_message(chat_id, msg_id))
+                                    create_task(self.delete_file_location(chat_id, msg_id))
                             except Exception as e:
                                 LOGGER.error(f"Failed to queue file for deletion: {e}")
                         break
@@ -777,6 +999,7 @@ class Database:
             return False
         
         tv['updated_on'] = datetime.utcnow()
+        self._with_search_fields("tv", tv)
         result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
         return result.modified_count > 0
 
@@ -798,6 +1021,7 @@ class Database:
                                 chat_id = int(f"-100{decoded_data['chat_id']}")
                                 msg_id = int(decoded_data['msg_id'])
                                 create_task(delete_message(chat_id, msg_id))
+                                create_task(self.delete_file_location(chat_id, msg_id))
                         except Exception as e:
                             LOGGER.error(f"Failed to queue file for deletion: {e}")
                 break
@@ -809,6 +1033,7 @@ class Database:
             return False
         
         tv['updated_on'] = datetime.utcnow()
+        self._with_search_fields("tv", tv)
         result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
         return result.modified_count > 0
 
@@ -833,6 +1058,7 @@ class Database:
                                         chat_id = int(f"-100{decoded_data['chat_id']}")
                                         msg_id = int(decoded_data['msg_id'])
                                         create_task(delete_message(chat_id, msg_id))
+                                        create_task(self.delete_file_location(chat_id, msg_id))
                                 except Exception as e:
                                     LOGGER.error(f"Failed to queue file for deletion: {e}")
                                 break
@@ -845,10 +1071,100 @@ class Database:
         if not found:
             return False
         tv['updated_on'] = datetime.utcnow()
+        self._with_search_fields("tv", tv)
         result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
         return result.modified_count > 0
 
 
+    # -------------------------------
+    # File Location Index
+    # -------------------------------
+    async def save_file_location(self, chat_id: int, msg_id: int, location: Dict[str, Any]) -> None:
+        try:
+            await self.dbs["tracking"]["file_locations"].update_one(
+                {"_id": f"{chat_id}:{msg_id}"},
+                {"$set": {**location, "updated_on": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            LOGGER.error(f"Failed to save file location {chat_id}:{msg_id}: {e}")
+
+    async def delete_file_location(self, chat_id: int, msg_id: int) -> None:
+        # Paired with every delete_message, so the index and the HEAD fast path stop
+        # describing files that no longer exist.
+        from Backend.helper.file_resolver import file_resolver
+        file_resolver.forget(chat_id, msg_id)
+        try:
+            await self.dbs["tracking"]["file_locations"].delete_one({"_id": f"{chat_id}:{msg_id}"})
+        except Exception as e:
+            LOGGER.error(f"Failed to delete file location {chat_id}:{msg_id}: {e}")
+
+    async def get_file_location(self, chat_id: int, msg_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.dbs["tracking"]["file_locations"].find_one({"_id": f"{chat_id}:{msg_id}"})
+        except Exception as e:
+            LOGGER.error(f"Failed to read file location {chat_id}:{msg_id}: {e}")
+            return None
+
+
+    # -------------------------------
+    # Index Management
+    # -------------------------------
+    def _storage_collections(self):
+        for db_index in range(1, len(self.dbs)):
+            for collection_name in ("movie", "tv"):
+                yield f"storage_{db_index}.{collection_name}", self.dbs[f"storage_{db_index}"][collection_name]
+
+    async def _missing_indexes(self, collection) -> List[IndexModel]:
+        # Matched on keys, not names, so equivalent manual indexes count as present.
+        def key_of(key) -> tuple:
+            return tuple((field, int(direction) if isinstance(direction, float) else direction) for field, direction in key.items())
+
+        existing = {key_of(index["key"]) async for index in collection.list_indexes()}
+        return [model for model in STORAGE_INDEXES if key_of(model.document["key"]) not in existing]
+
+    async def ensure_indexes(self) -> None:
+        for name, collection in self._storage_collections():
+            try:
+                missing = await self._missing_indexes(collection)
+                if missing:
+                    await collection.create_indexes(missing)
+                    LOGGER.info(f"Created indexes on {name}: {', '.join(m.document['name'] for m in missing)}")
+            except Exception as e:
+                LOGGER.error(f"Failed to ensure indexes on {name}: {e}")
+
+        for name, unused in (await self.find_unused_indexes()).items():
+            if unused:
+                LOGGER.info(f"Indexes on {name} unused since server start: {', '.join(unused)}")
+
+    async def find_unused_indexes(self) -> Dict[str, List[str]]:
+        # $indexStats counters reset when mongod restarts, and some hosted tiers reject
+        # the stage; either way this is a hint, not a reason to drop anything.
+        unused = {}
+        for name, collection in self._storage_collections():
+            try:
+                stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+            except Exception as e:
+                LOGGER.debug(f"$indexStats unavailable for {name}: {e}")
+                continue
+            unused[name] = sorted(
+                stat["name"] for stat in stats
+                if stat["name"] != "_id_" and not stat.get("accesses", {}).get("ops")
+            )
+        return unused
+
+    async def get_index_report(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, collection in self._storage_collections():
+            try:
+                report[name] = {"missing": [m.document["name"] for m in await self._missing_indexes(collection)]}
+            except Exception as e:
+                report[name] = {"missing": [], "error": str(e)}
+        for name, unused in (await self.find_unused_indexes()).items():
+            report[name]["unused"] = unused
+        return report
+
+
     # Get per-DB statistics (movies, tv shows, used size, etc.)
     async def get_database_stats(self):
         stats = []
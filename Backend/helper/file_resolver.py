@@ -0,0 +1,39 @@
+from typing import Optional
+from pyrogram.file_id import FileId
+from Backend import db
+from Backend.config import Telegram
+from Backend.helper.pyro import file_id_from_location
+from Backend.helper.ttl_cache import TTLCache
+
+
+class FileResolver:
+    # Client-independent view of resolved files: the first FileId seen for a
+    # (chat_id, message_id) carries the hash, DC, size, mime type and name, so
+    # repeated requests need no Telegram call to route, validate or describe a stream.
+    # Each ByteStreamer still keeps its own FileId for the actual download.
+    def __init__(self):
+        self.files = TTLCache(Telegram.FILE_ID_CACHE_TTL, Telegram.FILE_ID_CACHE_SIZE)
+
+    def peek(self, chat_id: int, message_id: int) -> Optional[FileId]:
+        return self.files.peek((chat_id, message_id))
+
+    def forget(self, chat_id: int, message_id: int) -> None:
+        self.files.pop((chat_id, message_id))
+
+    async def lookup(self, chat_id: int, message_id: int) -> Optional[FileId]:
+        # Metadata without touching Telegram: the cache first, then the file location index.
+        file_id = self.peek(chat_id, message_id)
+        if file_id is None:
+            location = await db.get_file_location(chat_id, message_id)
+            if location:
+                file_id = file_id_from_location(location)
+                self.files.set((chat_id, message_id), file_id)
+        return file_id
+
+    async def resolve(self, streamer, chat_id: int, message_id: int) -> FileId:
+        file_id = await streamer.get_file_properties(chat_id=chat_id, message_id=message_id)
+        self.files.set((chat_id, message_id), file_id)
+        return file_id
+
+
+file_resolver = FileResolver()
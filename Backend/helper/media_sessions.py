@@ -0,0 +1,246 @@
+import asyncio
+from secrets import randbits
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from pyrogram import Client, raw
+from pyrogram.errors import AuthBytesInvalid
+from pyrogram.session import Session, Auth
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.pyrofork.bot import multi_clients
+
+
+PING_TIMEOUT = 10
+POOL_GROW_LOAD = 4
+DC_RETRY_MAX = 3600
+session_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+media_pools: Dict[Tuple[int, int], "MediaSessionPool"] = {}
+# (client, DC) -> (consecutive failures, monotonic time of the next attempt)
+dc_failures: Dict[Tuple[int, int], Tuple[int, float]] = {}
+
+
+async def create_media_session(client: Client, dc_id: int) -> Optional[Session]:
+    if dc_id != await client.storage.dc_id():
+        media_session = Session(
+            client,
+            dc_id,
+            await Auth(client, dc_id, await client.storage.test_mode()).create(),
+            await client.storage.test_mode(),
+            is_media=True,
+        )
+        await media_session.start()
+        imported = False
+        try:
+            for _ in range(6):
+                exported_auth = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+                try:
+                    await media_session.send(raw.functions.auth.ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes))
+                    imported = True
+                    break
+                except AuthBytesInvalid:
+                    LOGGER.debug(f"Invalid authorization bytes for DC {dc_id}, retrying...")
+                except OSError:
+                    LOGGER.debug(f"Connection error, retrying...")
+                    await asyncio.sleep(2)
+        finally:
+            # ExportAuthorization can raise too (FloodWait, RPC errors); never leave
+            # the started session running behind a failure.
+            if not imported:
+                await media_session.stop()
+        if not imported:
+            LOGGER.debug(f"Failed to establish media session for DC {dc_id} after multiple retries")
+            return None
+    else:
+        media_session = Session(
+            client,
+            dc_id,
+            await client.storage.auth_key(),
+            await client.storage.test_mode(),
+            is_media=True,
+        )
+        await media_session.start()
+    LOGGER.debug(f"Created media session for DC {dc_id}")
+    return media_session
+
+
+async def get_media_session(client: Client, dc_id: int) -> Optional[Session]:
+    media_session = client.media_sessions.get(dc_id, None)
+    if media_session is not None:
+        LOGGER.debug(f"Using cached media session for DC {dc_id}")
+        return media_session
+
+    # One creator per (client, DC); concurrent first requests wait for it instead of
+    # each exporting their own authorization.
+    lock = session_locks.setdefault((id(client), dc_id), asyncio.Lock())
+    async with lock:
+        media_session = client.media_sessions.get(dc_id, None)
+        if media_session is None:
+            media_session = await create_media_session(client, dc_id)
+            if media_session is not None:
+                client.media_sessions[dc_id] = media_session
+                record_dc_result(client, dc_id, True)
+    return media_session
+
+
+class MediaSessionPool:
+    # Spreads requests for one (client, DC) over up to MEDIA_SESSIONS_PER_DC connections.
+    # The first member is always client.media_sessions[dc_id], which pyrogram owns and
+    # stops; extra sessions are opened under load and closed again once idle.
+    def __init__(self, client: Client, dc_id: int):
+        self.client = client
+        self.dc_id = dc_id
+        self.extra: List[Session] = []
+        self.loads: Dict[int, int] = {}
+        self.growing = False
+        self.last_busy = monotonic()
+
+    @property
+    def sessions(self) -> List[Session]:
+        primary = self.client.media_sessions.get(self.dc_id, None)
+        return ([primary] if primary is not None else []) + self.extra
+
+    def load(self, media_session: Session) -> int:
+        return self.loads.get(id(media_session), 0)
+
+    async def send(self, data, *args, **kwargs):
+        sessions = self.sessions
+        if not sessions:
+            raise TimeoutError(f"No media session available for DC {self.dc_id}")
+        media_session = min(sessions, key=self.load)
+        if self.load(media_session) >= POOL_GROW_LOAD:
+            self.last_busy = monotonic()
+            if len(sessions) < Telegram.MEDIA_SESSIONS_PER_DC and not self.growing:
+                self.growing = True
+                asyncio.create_task(self.grow())
+
+        key = id(media_session)
+        self.loads[key] = self.loads.get(key, 0) + 1
+        try:
+            return await media_session.send(data, *args, **kwargs)
+        finally:
+            self.loads[key] -= 1
+            if not self.loads[key]:
+                del self.loads[key]
+
+    async def grow(self) -> None:
+        try:
+            media_session = await create_media_session(self.client, self.dc_id)
+            if media_session is not None:
+                self.extra.append(media_session)
+                LOGGER.debug(f"Media session pool for DC {self.dc_id} grew to {len(self.sessions)}")
+        except Exception as e:
+            LOGGER.warning(f"Could not grow media session pool for DC {self.dc_id}: {e}")
+        finally:
+            self.growing = False
+
+    async def shrink(self) -> None:
+        idle = monotonic() - self.last_busy > Telegram.MEDIA_SESSION_HEALTH_INTERVAL
+        for media_session in list(self.extra):
+            if self.load(media_session):
+                continue
+            if idle or not await is_session_alive(media_session):
+                self.extra.remove(media_session)
+                try:
+                    await media_session.stop()
+                except Exception:
+                    pass
+                LOGGER.debug(f"Media session pool for DC {self.dc_id} shrank to {len(self.sessions)}")
+
+
+def get_media_pool(client: Client, dc_id: int) -> MediaSessionPool:
+    pool = media_pools.get((id(client), dc_id))
+    if pool is None:
+        pool = media_pools[(id(client), dc_id)] = MediaSessionPool(client, dc_id)
+    return pool
+
+
+async def get_known_dcs(client: Client) -> range:
+    return range(1, 4) if await client.storage.test_mode() else range(1, 6)
+
+
+def dc_backed_off(client: Client, dc_id: int) -> bool:
+    failure = dc_failures.get((id(client), dc_id))
+    return failure is not None and monotonic() < failure[1]
+
+
+def record_dc_result(client: Client, dc_id: int, ok: bool) -> None:
+    # DCs that keep failing are retried after 1, 2, 4... health intervals, up to
+    # DC_RETRY_MAX, instead of opening and abandoning a session every cycle.
+    key = (id(client), dc_id)
+    if ok:
+        dc_failures.pop(key, None)
+        return
+    failures = dc_failures.get(key, (0, 0.0))[0] + 1
+    delay = min(Telegram.MEDIA_SESSION_HEALTH_INTERVAL * 2 ** (failures - 1), DC_RETRY_MAX)
+    dc_failures[key] = (failures, monotonic() + delay)
+
+
+async def prewarm_client(index: int, client: Client) -> int:
+    warmed = 0
+    for dc_id in await get_known_dcs(client):
+        try:
+            ok = await get_media_session(client, dc_id) is not None
+        except Exception as e:
+            ok = False
+            LOGGER.warning(f"Could not pre-warm DC {dc_id} media session for client {index}: {e}")
+        record_dc_result(client, dc_id, ok)
+        warmed += ok
+    return warmed
+
+
+async def prewarm_media_sessions() -> None:
+    if not Telegram.MEDIA_SESSION_PREWARM:
+        return
+    results = await asyncio.gather(*(
+        prewarm_client(index, client) for index, client in list(multi_clients.items())
+    ))
+    LOGGER.info(f"Pre-warmed {sum(results)} media sessions across {len(results)} clients")
+
+
+async def is_session_alive(media_session: Session) -> bool:
+    if not media_session.is_started.is_set():
+        return False
+    try:
+        await media_session.send(raw.functions.Ping(ping_id=randbits(63)), timeout=PING_TIMEOUT)
+        return True
+    except (TimeoutError, OSError):
+        return False
+
+
+async def refresh_media_session(index: int, client: Client, dc_id: int) -> bool:
+    lock = session_locks.setdefault((id(client), dc_id), asyncio.Lock())
+    async with lock:
+        media_session = client.media_sessions.get(dc_id, None)
+        if media_session is not None:
+            if await is_session_alive(media_session):
+                return True
+            LOGGER.info(f"Media session for DC {dc_id} on client {index} is dead, re-establishing")
+            client.media_sessions.pop(dc_id, None)
+            try:
+                await media_session.stop()
+            except Exception:
+                pass
+        new_session = await create_media_session(client, dc_id)
+        if new_session is not None:
+            client.media_sessions[dc_id] = new_session
+        return new_session is not None
+
+
+async def media_session_health_check() -> None:
+    while True:
+        await asyncio.sleep(Telegram.MEDIA_SESSION_HEALTH_INTERVAL)
+        for index, client in list(multi_clients.items()):
+            dc_ids = set(client.media_sessions)
+            if Telegram.MEDIA_SESSION_PREWARM:
+                dc_ids.update(await get_known_dcs(client))
+            for dc_id in sorted(dc_ids):
+                if dc_backed_off(client, dc_id):
+                    continue
+                try:
+                    ok = await refresh_media_session(index, client, dc_id)
+                except Exception as e:
+                    ok = False
+                    LOGGER.error(f"Media session health check failed for DC {dc_id} on client {index}: {e}")
+                record_dc_result(client, dc_id, ok)
+        for pool in list(media_pools.values()):
+            await pool.shrink()
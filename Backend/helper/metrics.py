@@ -0,0 +1,93 @@
+from time import monotonic
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+BYTES_SERVED = Counter(
+    "stream_bytes_served", "Bytes sent to /dl clients", ["client"]
+)
+STREAM_TTFB = Histogram(
+    "stream_ttfb_seconds", "Time from opening a stream to its first chunk", ["client"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+GETFILE_LATENCY = Histogram(
+    "stream_getfile_seconds", "upload.GetFile round trip per part", ["client", "dc"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STREAM_ERRORS = Counter(
+    "stream_errors", "Errors while streaming, by exception type", ["type"]
+)
+ACTIVE_STREAMS = Gauge(
+    "stream_active", "Open stream generators", ["client", "dc"]
+)
+MEDIA_SESSION_LATENCY = Histogram(
+    "stream_media_session_seconds", "Time to obtain a media session", ["dc", "outcome"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class StreamMetrics:
+    # Per-stream bookkeeping for one yield_file/yield_file_striped generator.
+    def __init__(self, index: Optional[int], dc_id: int):
+        self.client = str(index)
+        self.started = monotonic()
+        self.first_chunk = True
+        self.active = ACTIVE_STREAMS.labels(self.client, str(dc_id))
+        self.active.inc()
+
+    def chunk(self, size: int) -> None:
+        if self.first_chunk:
+            self.first_chunk = False
+            STREAM_TTFB.labels(self.client).observe(monotonic() - self.started)
+        BYTES_SERVED.labels(self.client).inc(size)
+
+    def close(self) -> None:
+        self.active.dec()
+
+
+def record_error(error: BaseException) -> None:
+    STREAM_ERRORS.labels(type(error).__name__).inc()
+
+
+class StreamingCollector:
+    # Values that already live elsewhere are read at scrape time instead of mirrored.
+    # describe() lets the registry learn the names without importing the streaming
+    # modules, which import this one.
+    def families(self):
+        return (
+            CounterMetricFamily("stream_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"]),
+            GaugeMetricFamily("stream_chunk_cache_bytes", "Bytes held by the on-disk chunk cache"),
+            GaugeMetricFamily("stream_work_load", "Open streams per client as used for load balancing", labels=["client"]),
+        )
+
+    def describe(self):
+        return self.families()
+
+    def collect(self):
+        from Backend.helper.chunk_cache import chunk_cache
+        from Backend.helper.custom_dl import class_cache
+        from Backend.helper.file_resolver import file_resolver
+        from Backend.pyrofork.bot import work_loads
+
+        lookups, chunk_bytes, loads = self.families()
+        file_id_caches = [streamer.cached_file_ids for streamer in list(class_cache.values())]
+        caches = {
+            "chunk": [chunk_cache],
+            "file_id": file_id_caches,
+            "file_resolver": [file_resolver.files],
+        }
+        for name, members in caches.items():
+            lookups.add_metric([name, "hit"], sum(cache.hits for cache in members))
+            lookups.add_metric([name, "miss"], sum(cache.misses for cache in members))
+        yield lookups
+
+        chunk_bytes.add_metric([], chunk_cache.total_size)
+        yield chunk_bytes
+
+        for index, load in list(work_loads.items()):
+            loads.add_metric([str(index)], load)
+        yield loads
+
+
+REGISTRY.register(StreamingCollector())
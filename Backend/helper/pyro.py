@@ -1,4 +1,5 @@
 from pyrogram.file_id import FileId
+from datetime import datetime
 from typing import Optional
 from Backend.logger import LOGGER
 from Backend import __version__, now, timezone
@@ -24,21 +25,51 @@ async def get_file_ids(client: Client, chat_id: int, message_id: int) -> Optiona
             raise FIleNotFound("Message not found or empty")
         
         if media := is_media(message):
-            file_id_obj = FileId.decode(media.file_id)
-            file_unique_id = media.file_unique_id
-            
-            setattr(file_id_obj, 'file_name', getattr(media, 'file_name', ''))
-            setattr(file_id_obj, 'file_size', getattr(media, 'file_size', 0))
-            setattr(file_id_obj, 'mime_type', getattr(media, 'mime_type', ''))
-            setattr(file_id_obj, 'unique_id', file_unique_id)
-            
-            return file_id_obj
+            return get_media_file_id(media, message.date)
         else:
             raise FIleNotFound("No supported media found in message")
     except Exception as e:
         LOGGER.error(f"Error getting file IDs: {e}")
         raise
-        
+
+
+def get_media_file_id(media, date: Optional[datetime] = None) -> FileId:
+    file_id_obj = FileId.decode(media.file_id)
+    file_unique_id = media.file_unique_id
+
+    setattr(file_id_obj, 'file_name', getattr(media, 'file_name', ''))
+    setattr(file_id_obj, 'file_size', getattr(media, 'file_size', 0))
+    setattr(file_id_obj, 'mime_type', getattr(media, 'mime_type', ''))
+    setattr(file_id_obj, 'unique_id', file_unique_id)
+    setattr(file_id_obj, 'date', int(date.timestamp()) if date else 0)
+
+    return file_id_obj
+
+
+def file_location_from_id(file_id: FileId) -> dict:
+    return {
+        "file_id": file_id.encode(),
+        "dc_id": file_id.dc_id,
+        "file_size": getattr(file_id, 'file_size', 0),
+        "mime_type": getattr(file_id, 'mime_type', ''),
+        "file_name": getattr(file_id, 'file_name', ''),
+        "unique_id": getattr(file_id, 'unique_id', ''),
+        "date": getattr(file_id, 'date', 0),
+    }
+
+
+def file_id_from_location(location: dict) -> FileId:
+    file_id_obj = FileId.decode(location["file_id"])
+
+    setattr(file_id_obj, 'file_name', location.get('file_name', ''))
+    setattr(file_id_obj, 'file_size', location.get('file_size', 0))
+    setattr(file_id_obj, 'mime_type', location.get('mime_type', ''))
+    setattr(file_id_obj, 'unique_id', location.get('unique_id', ''))
+    setattr(file_id_obj, 'date', location.get('date', 0))
+    setattr(file_id_obj, 'from_index', True)
+
+    return file_id_obj
+
 
 
 def get_readable_file_size(size_in_bytes):
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Set
+from pyrogram.errors import FloodWait
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.pyrofork.bot import multi_clients, work_loads
+
+
+EWMA_ALPHA = 0.2
+DEFAULT_SECONDS_PER_MB = 0.5
+SESSION_PENALTY = 2.0
+RESOLVE_PENALTY = 0.5
+BASE_COOLDOWN = 5.0
+MAX_COOLDOWN = 60.0
+
+
+@dataclass
+class ClientStats:
+    latency: Optional[float] = None
+    seconds_per_mb: Optional[float] = None
+    cooldown_until: float = 0.0
+    consecutive_errors: int = 0
+    errors: int = 0
+    parts: int = 0
+    bytes: int = 0
+
+
+def ewma(previous: Optional[float], value: float) -> float:
+    return value if previous is None else previous + EWMA_ALPHA * (value - previous)
+
+
+class LeastLoadedScheduler:
+    # The original policy: the client with the fewest open generators in work_loads.
+    def __init__(self):
+        self.stats: Dict[int, ClientStats] = {}
+
+    def get_stats(self, index: int) -> ClientStats:
+        stats = self.stats.get(index)
+        if stats is None:
+            stats = self.stats[index] = ClientStats()
+        return stats
+
+    def score(self, index: int, dc_id: Optional[int] = None, warm: Optional[Set[int]] = None) -> float:
+        return work_loads.get(index, 0)
+
+    def rank(
+        self, dc_id: Optional[int] = None, exclude: Iterable[int] = (), warm: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        excluded = set(exclude)
+        warm = set(warm) if warm is not None else None
+        candidates = [i for i in work_loads if i not in excluded and i in multi_clients]
+        return sorted(candidates, key=lambda i: self.score(i, dc_id, warm))
+
+    def pick(
+        self, dc_id: Optional[int] = None, exclude: Iterable[int] = (), warm: Optional[Iterable[int]] = None
+    ) -> int:
+        ranked = self.rank(dc_id, exclude, warm)
+        return ranked[0] if ranked else min(work_loads, key=work_loads.get)
+
+    def pick_many(
+        self, count: int, dc_id: Optional[int] = None, exclude: Iterable[int] = (), warm: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        return self.rank(dc_id, exclude, warm)[:count]
+
+    def record_part(self, index: Optional[int], size: int, elapsed: float) -> None:
+        if index is None:
+            return
+        stats = self.get_stats(index)
+        stats.parts += 1
+        stats.bytes += size
+        stats.consecutive_errors = 0
+        stats.latency = ewma(stats.latency, elapsed)
+        # Tiny probe parts say little about bandwidth, so only larger ones feed the rate.
+        if size >= 64 * 1024:
+            stats.seconds_per_mb = ewma(stats.seconds_per_mb, elapsed / (size / (1024 * 1024)))
+
+    def record_error(self, index: Optional[int], error: BaseException) -> None:
+        if index is None:
+            return
+        stats = self.get_stats(index)
+        stats.errors += 1
+        stats.consecutive_errors += 1
+        if isinstance(error, FloodWait):
+            cooldown = float(error.value)
+        else:
+            cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (stats.consecutive_errors - 1))
+        stats.cooldown_until = max(stats.cooldown_until, monotonic() + cooldown)
+        LOGGER.debug(f"Client {index} cooling down for {cooldown:.0f}s after {type(error).__name__}")
+
+
+class WeightedScheduler(LeastLoadedScheduler):
+    # Estimated time to serve one more MiB: open streams times the client's EWMA
+    # seconds-per-MiB, plus a penalty when it has no warm media session for the
+    # file's DC or has not resolved the file yet (`warm` lists those that have).
+    # Clients cooling down after FloodWait/errors go to the back.
+    def score(self, index: int, dc_id: Optional[int] = None, warm: Optional[Set[int]] = None) -> float:
+        stats = self.get_stats(index)
+        cost = (work_loads.get(index, 0) + 1) * (stats.seconds_per_mb or DEFAULT_SECONDS_PER_MB)
+        client = multi_clients.get(index)
+        if dc_id is not None and client is not None and dc_id not in client.media_sessions:
+            cost += SESSION_PENALTY
+        if warm is not None and index not in warm:
+            cost += RESOLVE_PENALTY
+        remaining = stats.cooldown_until - monotonic()
+        if remaining > 0:
+            cost += MAX_COOLDOWN + remaining
+        return cost
+
+
+SCHEDULERS = {
+    "least_loaded": LeastLoadedScheduler,
+    "weighted": WeightedScheduler,
+}
+
+scheduler = SCHEDULERS.get(Telegram.STREAM_SCHEDULER, WeightedScheduler)()
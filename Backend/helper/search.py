@@ -0,0 +1,66 @@
+import re
+import unicodedata
+from typing import Iterable, List, Set
+
+
+SEARCH_VERSION = 1
+GRAM_SIZE = 3
+
+# Turkish I/İ/ı all fold to "i" so either spelling finds the other; casefold() alone
+# maps "I" to "i" and "İ" to "i̇", and leaves "ı" untouched.
+TURKISH_FOLD = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+
+
+def fold_text(text: str) -> str:
+    # Case, Turkish I and diacritics folded, punctuation collapsed to single spaces:
+    # "Şahsiyet: İLK Bölüm" -> "sahsiyet ilk bolum".
+    text = unicodedata.normalize("NFKD", (text or "").translate(TURKISH_FOLD).casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+def word_grams(word: str) -> Set[str]:
+    if len(word) < GRAM_SIZE:
+        return {word}
+    return {word[i:i + GRAM_SIZE] for i in range(len(word) - GRAM_SIZE + 1)}
+
+
+def text_grams(text: str) -> List[str]:
+    grams = set()
+    for word in text.split():
+        grams |= word_grams(word)
+    return sorted(grams)
+
+
+def query_grams(words: Iterable[str]) -> List[str]:
+    # Words shorter than a gram only pass the substring check, since they may be the
+    # start of a longer word that was indexed by its trigrams.
+    grams = set()
+    for word in words:
+        if len(word) >= GRAM_SIZE:
+            grams |= word_grams(word)
+    return sorted(grams)
+
+
+def search_fields(title: str, file_names: Iterable[str]) -> dict:
+    search_title = fold_text(title)
+    search_text = " ".join([search_title, *(fold_text(name) for name in file_names if name)])
+    return {
+        "search_title": search_title,
+        "search_text": search_text,
+        "search_grams": text_grams(search_text),
+        "search_version": SEARCH_VERSION,
+    }
+
+
+def document_search_fields(collection_name: str, document: dict) -> dict:
+    if collection_name == "movie":
+        names = [quality.get("name") for quality in document.get("telegram", [])]
+    else:
+        names = [
+            quality.get("name")
+            for season in document.get("seasons", [])
+            for episode in season.get("episodes", [])
+            for quality in episode.get("telegram", [])
+        ]
+    return search_fields(document.get("title", ""), names)
@@ -0,0 +1,165 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from itertools import count
+from time import monotonic
+from typing import AsyncIterator, Deque, Dict, Optional
+from Backend.config import Telegram
+from Backend.helper.ttl_cache import TTLCache
+
+
+INTERACTIVE = 0
+BULK = 1
+MIN_BURST = 4 * 1024 * 1024
+IP_BUCKET_IDLE = 600
+IP_BUCKET_ENTRIES = 4096
+stream_ids = count(1)
+
+
+def mbps_to_bytes(mbps: float) -> float:
+    return mbps * 1000 * 1000 / 8
+
+
+class TokenBucket:
+    # `rate` bytes per second with a burst allowance; rate 0 means unlimited.
+    # Consumers may overdraw and then wait off the debt, so one call never blocks twice.
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate * 2, MIN_BURST)
+        self.tokens = self.burst
+        self.updated = monotonic()
+
+    def reserve(self, size: int) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= size
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Stream:
+    def __init__(self, ip: str, priority: int, bucket: TokenBucket, ip_bucket: TokenBucket):
+        self.id = next(stream_ids)
+        self.ip = ip
+        self.priority = priority
+        self.bucket = bucket
+        self.ip_bucket = ip_bucket
+
+
+current_stream: ContextVar[Optional[Stream]] = ContextVar("current_stream", default=None)
+
+
+class FairQueue:
+    # Bounded GetFile slots granted round-robin across streams, interactive playback
+    # before bulk downloads, so one greedy download cannot fill every slot.
+    def __init__(self, slots: int):
+        self.free = slots
+        self.waiters: Dict[int, "OrderedDict[int, Deque[asyncio.Future]]"] = {
+            INTERACTIVE: OrderedDict(), BULK: OrderedDict()
+        }
+
+    def has_waiters(self) -> bool:
+        return any(self.waiters.values())
+
+    async def acquire(self) -> None:
+        if self.free > 0 and not self.has_waiters():
+            self.free -= 1
+            return
+        stream = current_stream.get()
+        priority = stream.priority if stream else INTERACTIVE
+        key = stream.id if stream else 0
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[priority].setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self.discard(priority, key, future)
+            raise
+
+    def discard(self, priority: int, key: int, future: asyncio.Future) -> None:
+        queue = self.waiters[priority].get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self.waiters[priority][key]
+
+    def release(self) -> None:
+        for priority in (INTERACTIVE, BULK):
+            streams = self.waiters[priority]
+            while streams:
+                key, queue = next(iter(streams.items()))
+                future = queue.popleft()
+                if queue:
+                    streams.move_to_end(key)
+                else:
+                    del streams[key]
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.free += 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class Shaper:
+    # Token buckets per connection, per client IP and for the whole server. IP buckets
+    # outlive connections and expire only after IP_BUCKET_IDLE seconds without a stream,
+    # so back-to-back Range requests share one budget instead of each getting a fresh
+    # burst.
+    def __init__(self):
+        self.global_bucket = TokenBucket(mbps_to_bytes(Telegram.STREAM_GLOBAL_RATE_MBPS))
+        self.ip_buckets = TTLCache(IP_BUCKET_IDLE, IP_BUCKET_ENTRIES)
+
+    def open(self, ip: str, priority: int) -> Stream:
+        rate = Telegram.STREAM_CONNECTION_RATE_MBPS
+        if priority == BULK and Telegram.STREAM_BULK_RATE_MBPS:
+            rate = Telegram.STREAM_BULK_RATE_MBPS
+        ip_bucket = self.ip_buckets.peek(ip)
+        if ip_bucket is None:
+            ip_bucket = TokenBucket(mbps_to_bytes(Telegram.STREAM_IP_RATE_MBPS))
+        self.ip_buckets.set(ip, ip_bucket)
+        return Stream(ip, priority, TokenBucket(mbps_to_bytes(rate)), ip_bucket)
+
+    def touch(self, stream: Stream) -> None:
+        # Keeps the IP's bucket alive while it streams and restarts the idle timer at
+        # the end of each stream.
+        self.ip_buckets.set(stream.ip, stream.ip_bucket)
+
+    async def throttle(self, stream: Stream, size: int) -> None:
+        self.touch(stream)
+        delay = max(
+            stream.bucket.reserve(size),
+            stream.ip_bucket.reserve(size),
+            self.global_bucket.reserve(size),
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def shape(self, body: AsyncIterator[bytes], ip: str, priority: int) -> AsyncIterator[bytes]:
+        # Runs in the response task, so GetFile calls made for this body see the stream.
+        stream = self.open(ip, priority)
+        current_stream.set(stream)
+        try:
+            async for chunk in body:
+                await self.throttle(stream, len(chunk))
+                yield chunk
+        finally:
+            self.touch(stream)
+            await body.aclose()
+
+
+shaper = Shaper()
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    # Collapses concurrent calls for the same key into one awaitable. The shared call
+    # runs in its own task so a cancelled caller does not cancel it for the others;
+    # once every caller has gone the call itself is cancelled.
+    def __init__(self):
+        self.__inflight: Dict[Hashable, asyncio.Task] = {}
+        self.__waiters: Dict[Hashable, int] = {}
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self.__inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__inflight
+
+    def forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.__inflight.get(key) is task:
+            del self.__inflight[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.__inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self.__inflight[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        else:
+            self.shared += 1
+
+        self.__waiters[key] = self.__waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.__waiters[key] -= 1
+            if not self.__waiters[key]:
+                del self.__waiters[key]
+                if not task.done():
+                    self.forget(key, task)
+                    task.cancel()
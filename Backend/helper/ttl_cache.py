@@ -0,0 +1,64 @@
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+from Backend.logger import LOGGER
+from Backend.helper.single_flight import SingleFlight
+
+
+class TTLCache:
+    # LRU-bounded cache with a per-entry TTL. Entries older than `refresh_after` of
+    # their TTL are still served but reloaded in the background, so hot keys never
+    # expire all at once. Concurrent loads of one key share a single loader call.
+    def __init__(self, ttl: float, max_entries: int, refresh_after: float = 0.8):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_after = refresh_after
+        self.hits = 0
+        self.misses = 0
+        self.__entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.__loads = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        entry = self.__entries.get(key)
+        if entry is None or monotonic() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.__entries[key] = (monotonic(), value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self.__entries.pop(key, None)
+
+    async def load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        self.set(key, value)
+        return value
+
+    async def refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await self.__loads.do(key, lambda: self.load(key, loader))
+        except Exception as e:
+            LOGGER.debug(f"Refresh-ahead failed for {key}: {e}")
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.__entries.get(key)
+        if entry is not None:
+            age = monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self.__entries.move_to_end(key)
+                if age >= self.ttl * self.refresh_after and key not in self.__loads:
+                    asyncio.create_task(self.refresh(key, loader))
+                return entry[1]
+            del self.__entries[key]
+
+        self.misses += 1
+        return await self.__loads.do(key, lambda: self.load(key, loader))
@@ -120,7 +120,7 @@ async def fix_metadata_handler(_, message):
         return meta
 
 
-    async def _safe_update_movie(collection, movie_doc):
+    async def _safe_update_movie(collection, movie_doc, db_index):
         nonlocal DONE, last_progress_edit
 
         if CANCEL_REQUESTED:
@@ -197,6 +197,8 @@ async def fix_metadata_handler(_, message):
                 filter_q = {"_id": doc_id} if doc_id else {"imdb_id": imdb_id}
                 try:
                     await collection.update_one(filter_q, {"$set": update_query})
+                    if doc_id and {"imdb_id", "tmdb_id"} & update_query.keys():
+                        await db.update_media_routes("movie", current, db_index)
                 except Exception as e:
                     LOGGER.exception(f"DB update failed for movie {title}: {e}")
 
@@ -216,7 +218,7 @@ async def fix_metadata_handler(_, message):
             LOGGER.exception(f"Error updating movie {movie_doc.get('title')}: {e}")
             DONE += 1
 
-    async def _safe_update_tv(collection, tv_doc):
+    async def _safe_update_tv(collection, tv_doc, db_index):
         nonlocal DONE, last_progress_edit
 
         if CANCEL_REQUESTED:
@@ -292,6 +294,8 @@ async def fix_metadata_handler(_, message):
                 filter_q = {"_id": doc_id} if doc_id else {"imdb_id": imdb_id}
                 try:
                     await collection.update_one(filter_q, {"$set": update_query})
+                    if doc_id and {"imdb_id", "tmdb_id"} & update_query.keys():
+                        await db.update_media_routes("tv", current, db_index)
                 except Exception as e:
                     LOGGER.exception(f"DB update failed for TV {title}: {e}")
 
@@ -393,7 +397,7 @@ async def fix_metadata_handler(_, message):
             async for movie in cursor:
                 if CANCEL_REQUESTED:
                     break
-                tasks.append(_safe_update_movie(collection, movie))
+                tasks.append(_safe_update_movie(collection, movie, i))
                 if len(tasks) >= TASK_BATCH:
                     await asyncio.gather(*tasks, return_exceptions=True)
                     tasks = []
@@ -410,7 +414,7 @@ async def fix_metadata_handler(_, message):
             async for tv in cursor:
                 if CANCEL_REQUESTED:
                     break
-                tasks.append(_safe_update_tv(collection, tv))
+                tasks.append(_safe_update_tv(collection, tv, i))
                 if len(tasks) >= TASK_BATCH:
                     await asyncio.gather(*tasks, return_exceptions=True)
                     tasks = []
@@ -4,7 +4,7 @@ from Backend.helper.task_manager import edit_message
 from Backend.logger import LOGGER
 from Backend import db
 from Backend.config import Telegram
-from Backend.helper.pyro import clean_filename, get_readable_file_size, remove_urls
+from Backend.helper.pyro import clean_filename, file_location_from_id, get_media_file_id, get_readable_file_size, remove_urls
 from Backend.helper.metadata import metadata
 from pyrogram import filters, Client
 from pyrogram.types import Message
@@ -40,6 +40,7 @@ async def file_receive_handler(client: Client, message: Message):
                 msg_id = message.id
                 size = get_readable_file_size(file.file_size)
                 channel = str(message.chat.id).replace("-100", "")
+                await db.save_file_location(message.chat.id, msg_id, file_location_from_id(get_media_file_id(file, message.date)))
 
                 metadata_info = await metadata(clean_filename(title), int(channel), msg_id)
                 if metadata_info is None:
@@ -1,6 +1,7 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from Backend.helper.custom_filter import CustomFilters
+from Backend.helper.search import document_search_fields
 from pymongo import MongoClient
 import os, re
 from time import time
@@ -94,6 +95,7 @@ def process_delete(db, id_type, val, imdb_fallback=None, test=False,
                         db["tv"].delete_one({"_id": doc["_id"]})
                     else:
                         doc["seasons"] = doc_seasons
+                        doc.update(document_search_fields("tv", doc))
                         db["tv"].replace_one({"_id": doc["_id"]}, doc)
 
             else:
@@ -143,6 +145,7 @@ def process_delete(db, id_type, val, imdb_fallback=None, test=False,
                     db["movie"].delete_one({"_id": doc["_id"]})
                 else:
                     doc["telegram"] = new
+                    doc.update(document_search_fields("movie", doc))
                     db["movie"].replace_one({"_id": doc["_id"]}, doc)
 
     if allow("tv"):
@@ -177,6 +180,7 @@ def process_delete(db, id_type, val, imdb_fallback=None, test=False,
                 if not doc["seasons"]:
                     db["tv"].delete_one({"_id": doc["_id"]})
                 else:
+                    doc.update(document_search_fields("tv", doc))
                     db["tv"].replace_one({"_id": doc["_id"]}, doc)
 
     return deleted
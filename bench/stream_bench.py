@@ -0,0 +1,333 @@
+# Offline /dl benchmark: the real FastAPI app and streaming stack on top of a fake
+# Telegram backend that answers upload.GetFile from local files.
+#
+#   python -m bench.stream_bench --generate 4 --size 256 --concurrency 32 --requests 400
+#   python -m bench.stream_bench --files a.mkv b.mp4 --latency 80 --jitter 40 --mix seek=60,probe=30,full=10
+#
+# The server runs in a child process (`serve`) so its CPU time can be measured apart
+# from the load generator. Streaming settings (STREAM_PREFETCH_PARTS, STREAM_MAX_INFLIGHT,
+# CHUNK_CACHE_DIR, STREAM_*_RATE_MBPS, ...) are read from the environment as usual.
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# Placeholder URIs: Database() needs two, and the bench never opens a connection.
+os.environ.setdefault("DATABASE", "mongodb://127.0.0.1:1/bench,mongodb://127.0.0.1:1/bench")
+
+CHAT_ID = -1000000000001
+DC_ID = 2
+MEDIA_ID_BASE = 7_000_000_000
+
+
+class FakeBackend:
+    # Serves GetFile from local files and enforces the real API's alignment rules, so
+    # a request Telegram would reject fails here too.
+    def __init__(self, files: List[str], latency: float, jitter: float, session_mbps: float):
+        self.files = {MEDIA_ID_BASE + i: path for i, path in enumerate(files)}
+        self.fds = {media_id: os.open(path, os.O_RDONLY) for media_id, path in self.files.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.session_rate = session_mbps * 1000 * 1000 / 8
+
+    async def get_file(self, request):
+        from pyrogram import raw
+        from pyrogram.errors import LimitInvalid, OffsetInvalid
+
+        offset, limit = request.offset, request.limit
+        if limit <= 0 or limit % 4096 or (1024 * 1024) % limit:
+            raise LimitInvalid()
+        if offset % 4096 or offset // (1024 * 1024) != (offset + limit - 1) // (1024 * 1024):
+            raise OffsetInvalid()
+
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if self.session_rate:
+            delay += limit / self.session_rate
+        await asyncio.sleep(delay)
+        data = os.pread(self.fds[request.location.id], limit, offset)
+        return raw.types.upload.File(type=raw.types.storage.FileUnknown(), mtime=0, bytes=data)
+
+
+class FakeSession:
+    def __init__(self, backend: FakeBackend, dc_id: int):
+        self.backend = backend
+        self.dc_id = dc_id
+        self.is_started = asyncio.Event()
+        self.is_started.set()
+
+    async def send(self, data, *args, **kwargs):
+        from pyrogram import raw
+
+        if isinstance(data, raw.functions.upload.GetFile):
+            return await self.backend.get_file(data)
+        if isinstance(data, raw.functions.Ping):
+            return raw.types.Pong(msg_id=0, ping_id=data.ping_id)
+        raise NotImplementedError(type(data).__name__)
+
+    async def stop(self):
+        self.is_started.clear()
+
+
+class FakeStorage:
+    async def dc_id(self):
+        return DC_ID
+
+    async def test_mode(self):
+        return False
+
+    async def auth_key(self):
+        return b""
+
+
+class FakeClient:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self.storage = FakeStorage()
+        self.media_sessions = {dc_id: FakeSession(backend, dc_id) for dc_id in range(1, 6)}
+
+    async def get_messages(self, chat_id: int, message_ids: int):
+        from pyrogram.file_id import FileId, FileType, FileUniqueId, FileUniqueType
+
+        media_id = MEDIA_ID_BASE + message_ids - 1
+        path = self.backend.files[media_id]
+        document = SimpleNamespace(
+            file_id=FileId(
+                file_type=FileType.DOCUMENT, dc_id=DC_ID, media_id=media_id,
+                access_hash=media_id, file_reference=b"bench"
+            ).encode(),
+            file_unique_id=FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=media_id).encode(),
+            file_name=os.path.basename(path),
+            file_size=os.path.getsize(path),
+            mime_type="video/x-matroska",
+        )
+        media = dict.fromkeys(["photo", "video", "audio", "voice", "video_note", "sticker", "animation"])
+        return SimpleNamespace(empty=False, date=datetime.now(), document=document, **media)
+
+
+def install_fake_backend(backend: FakeBackend, clients: int) -> None:
+    from Backend import db
+    from Backend.helper import media_sessions
+    from Backend.pyrofork.bot import multi_clients, work_loads
+
+    locations: Dict[str, dict] = {}
+
+    async def save_file_location(chat_id, msg_id, location):
+        locations[f"{chat_id}:{msg_id}"] = location
+
+    async def get_file_location(chat_id, msg_id):
+        return locations.get(f"{chat_id}:{msg_id}")
+
+    async def create_media_session(client, dc_id):
+        return FakeSession(backend, dc_id)
+
+    db.save_file_location = save_file_location
+    db.get_file_location = get_file_location
+    media_sessions.create_media_session = create_media_session
+    multi_clients.clear()
+    work_loads.clear()
+    for index in range(clients):
+        multi_clients[index] = FakeClient(backend)
+        work_loads[index] = 0
+
+
+def serve(args) -> None:
+    import uvicorn
+    from Backend.fastapi.main import app
+
+    backend = FakeBackend(args.files, args.latency / 1000, args.jitter / 1000, args.session_mbps)
+    install_fake_backend(backend, args.clients)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ("seek", "probe", "full"):
+            raise SystemExit(f"Unknown request kind {name!r} in --mix")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def make_request(kind: str, file_size: int, range_size: int) -> Optional[str]:
+    if kind == "probe":
+        # Container probes: the header or the index at the tail of the file.
+        return random.choice(["bytes=0-65535", "bytes=-65536"])
+    if kind == "seek":
+        start = random.randrange(max(1, file_size - range_size))
+        return f"bytes={start}-{min(file_size, start + range_size) - 1}"
+    return None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def drive(args, base_url: str, urls: List[str], sizes: List[int], contents: List[Optional[bytes]]):
+    import httpx
+
+    kinds = parse_mix(args.mix)
+    population, weights = list(kinds), list(kinds.values())
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(random.randrange(len(urls)))
+
+    ttfbs: List[float] = []
+    errors: Dict[str, int] = {}
+    total = 0
+
+    async def worker(http: httpx.AsyncClient):
+        nonlocal total
+        while not queue.empty():
+            file_index = queue.get_nowait()
+            kind = random.choices(population, weights)[0]
+            range_header = make_request(kind, sizes[file_index], args.range_size * 1024 * 1024)
+            headers = {"Range": range_header} if range_header else {}
+            started = time.perf_counter()
+            received, first = bytearray() if args.verify else None, None
+            try:
+                async with http.stream("GET", urls[file_index], headers=headers) as response:
+                    if response.status_code not in (200, 206):
+                        raise RuntimeError(f"HTTP {response.status_code}")
+                    async for chunk in response.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter() - started
+                        total += len(chunk)
+                        if received is not None:
+                            received += chunk
+                ttfbs.append(first or 0.0)
+                if received is not None:
+                    expected = contents[file_index]
+                    if range_header:
+                        spec = range_header[6:]
+                        if spec.startswith("-"):
+                            expected = expected[len(expected) - int(spec[1:]):]
+                        else:
+                            a, b = map(int, spec.split("-"))
+                            expected = expected[a:b + 1]
+                    if bytes(received) != expected:
+                        raise RuntimeError("body mismatch")
+            except Exception as e:
+                name = type(e).__name__ if not isinstance(e, RuntimeError) else str(e)
+                errors[name] = errors.get(name, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(http) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, total, ttfbs, errors
+
+
+async def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise SystemExit("Benchmark server did not start")
+
+
+def run(args) -> None:
+    import psutil
+    from Backend.helper.encrypt import encode_string
+
+    tmp = None
+    if args.generate:
+        tmp = tempfile.TemporaryDirectory(prefix="stream-bench-")
+        args.files = []
+        for i in range(args.generate):
+            path = os.path.join(tmp.name, f"bench-{i}.mkv")
+            with open(path, "wb") as f:
+                for _ in range(args.size):
+                    f.write(os.urandom(1024 * 1024))
+            args.files.append(path)
+    if not args.files:
+        raise SystemExit("Pass --files or --generate")
+
+    port = free_port()
+    command = [
+        sys.executable, "-m", "bench.stream_bench", "serve", "--port", str(port),
+        "--clients", str(args.clients), "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--session-mbps", str(args.session_mbps), "--files", *args.files,
+    ]
+    server = subprocess.Popen(command)
+    try:
+        asyncio.run(wait_for_port(port))
+
+        async def make_urls():
+            return [
+                f"/dl/{await encode_string({'chat_id': str(CHAT_ID)[4:], 'msg_id': i + 1})}/{os.path.basename(path)}"
+                for i, path in enumerate(args.files)
+            ]
+
+        urls = asyncio.run(make_urls())
+        sizes = [os.path.getsize(path) for path in args.files]
+        contents = [open(path, "rb").read() if args.verify else None for path in args.files]
+
+        process = psutil.Process(server.pid)
+        cpu_before = sum(process.cpu_times()[:2])
+        elapsed, total, ttfbs, errors = asyncio.run(
+            drive(args, f"http://127.0.0.1:{port}", urls, sizes, contents)
+        )
+        cpu = sum(process.cpu_times()[:2]) - cpu_before
+    finally:
+        server.terminate()
+        server.wait()
+        if tmp:
+            tmp.cleanup()
+
+    gbits = total * 8 / 1e9
+    print(f"requests      {len(ttfbs)} ok, {sum(errors.values())} failed {errors or ''}")
+    print(f"transferred   {total / (1024 * 1024):.1f} MiB in {elapsed:.2f}s")
+    print(f"throughput    {total * 8 / elapsed / 1e6:.1f} Mbit/s")
+    print(f"ttfb p50/p99  {percentile(ttfbs, 50) * 1000:.1f} / {percentile(ttfbs, 99) * 1000:.1f} ms")
+    print(f"server cpu    {cpu:.2f}s ({cpu / gbits:.2f} cpu-s per Gbit)" if gbits else f"server cpu    {cpu:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /dl against a fake Telegram backend")
+    parser.add_argument("mode", nargs="?", default="run", choices=["run", "serve"])
+    parser.add_argument("--files", nargs="*", default=[], help="local files served as Telegram documents")
+    parser.add_argument("--generate", type=int, default=0, help="create this many random files instead")
+    parser.add_argument("--size", type=int, default=128, help="size of generated files in MiB")
+    parser.add_argument("--clients", type=int, default=1, help="number of fake bot clients")
+    parser.add_argument("--latency", type=float, default=50, help="GetFile latency in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="GetFile latency jitter in ms")
+    parser.add_argument("--session-mbps", type=float, default=0, help="per-call transfer rate, 0 for none")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--range-size", type=int, default=8, help="seek range length in MiB")
+    parser.add_argument("--mix", default="seek=70,probe=20,full=10", help="weights of seek/probe/full requests")
+    parser.add_argument("--verify", action="store_true", help="compare every body with the source file")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()